@@ -1,62 +1,88 @@
+import time
+launch_time = time.perf_counter()  # Отсчёт времени до первого кадра (включая импорт pygame)
 import pygame
 import math
 import random
-import time
 import sys
 import os
 import configparser
+import argparse
+import atexit
+import json
+import threading
+import multiprocessing
+import statistics
+import struct
+import zlib
+import hashlib
+import heapq
+import bisect
+from collections import Counter, deque
 import numpy as np
 
 base_path = os.path.dirname(os.path.abspath(__file__))
+first_frame_time = None
+bootstrap_finished_time = None
+startup_timings = []  # Этапы запуска: (название, мс)
+report_startup = False  # Печатать отчёт о запуске (--startup-report)
+record_path = None  # Куда записывать повтор каждого забега (--record)
+
+# Настройки по умолчанию; до bootstrap() игра работает с ними, не трогая settings.cfg
+def default_settings():
+    return {
+        'resolution': (1280, 720),
+        'render_resolution': None,  # None — отрисовка в разрешении окна
+        'fullscreen': False,
+        'volume_music': 0.5,
+        'volume_hits': 0.5,
+        'volume_other': 0.5,
+        'language': 'en',
+        'currency': 0.0,
+        'purchased_upgrades': []
+    }
+
+def parse_render_resolution(value):
+    if value == 'native':
+        return None
+    return tuple(map(int, value.split('x')))
 
 def load_settings():
     config = configparser.ConfigParser()
     config_file = os.path.join(base_path, 'settings.cfg')
     
     # Настройки по умолчанию
-    default_settings = {
-        'resolution': '1280x720',
-        'fullscreen': 'False',
-        'volume_music': '0.5',
-        'volume_hits': '0.5',
-        'volume_other': '0.5',
-        'language': 'en',
-        'currency': '0',
-        'purchased_upgrades': ''
-    }
+    defaults = default_settings()
     
     if os.path.exists(config_file):
         config.read(config_file)
         settings = {
             'resolution': tuple(map(int, config.get('Settings', 'resolution').split('x'))),
+            'render_resolution': parse_render_resolution(config.get('Settings', 'render_resolution', fallback='native')),
             'fullscreen': config.getboolean('Settings', 'fullscreen'),
             'volume_music': config.getfloat('Settings', 'volume_music'),
             'volume_hits': config.getfloat('Settings', 'volume_hits'),
             'volume_other': config.getfloat('Settings', 'volume_other'),
-            'language': config.get('Settings', 'language', fallback=default_settings['language']),
+            'language': config.get('Settings', 'language', fallback=defaults['language']),
             'currency': config.getfloat('Settings', 'currency', fallback=0.0),
             'purchased_upgrades': config.get('Settings', 'purchased_upgrades', fallback='').split(',') if config.get('Settings', 'purchased_upgrades', fallback='') else []
         }
     else:
         # Используем настройки по умолчанию и сохраняем их
-        settings = {
-            'resolution': tuple(map(int, default_settings['resolution'].split('x'))),
-            'fullscreen': default_settings['fullscreen'] == 'True',
-            'volume_music': float(default_settings['volume_music']),
-            'volume_hits': float(default_settings['volume_hits']),
-            'volume_other': float(default_settings['volume_other']),
-            'language': default_settings['language'],
-            'currency': 0.0,
-            'purchased_upgrades': []
-        }
+        settings = defaults
         save_settings(settings)
     
     return settings
 
-def save_settings(settings):
+def format_resolution(resolution, native_label):
+    if resolution is None:
+        return native_label
+    return f"{resolution[0]}x{resolution[1]}"
+
+def write_settings_file(settings):
     config = configparser.ConfigParser()
     config['Settings'] = {
         'resolution': f"{settings['resolution'][0]}x{settings['resolution'][1]}",
+        'render_resolution': format_resolution(settings.get('render_resolution'), 'native'),
         'fullscreen': str(settings['fullscreen']),
         'volume_music': str(settings['volume_music']),
         'volume_hits': str(settings['volume_hits']),
@@ -66,8 +92,77 @@ def save_settings(settings):
         'purchased_upgrades': ','.join(settings.get('purchased_upgrades', []))
     }
     config_file = os.path.join(base_path, 'settings.cfg')
-    with open(config_file, 'w') as configfile:
+    # Пишем во временный файл и подменяем им конфиг: при сбое на диске остаётся старый файл целиком
+    temp_file = config_file + '.tmp'
+    with open(temp_file, 'w') as configfile:
         config.write(configfile)
+        configfile.flush()
+        os.fsync(configfile.fileno())
+    os.replace(temp_file, config_file)
+
+# Отложенная запись настроек: изменения, сделанные подряд, сливаются в одну запись,
+# которая выполняется в фоновом потоке, а не в потоке отрисовки
+class SettingsWriter:
+    def __init__(self, delay=0.5):
+        self.delay = delay  # Сколько секунд ждать новых изменений перед записью
+        self.pending = None  # Снимок настроек, ещё не записанный на диск
+        self.due_time = 0
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.thread = None
+        self.enabled = True  # Воркеры пакетной симуляции только читают settings.cfg
+
+    def request(self, settings):
+        if not self.enabled:
+            return
+        snapshot = dict(settings, purchased_upgrades=list(settings.get('purchased_upgrades', [])))
+        with self.condition:
+            self.pending = snapshot
+            self.due_time = time.monotonic() + self.delay
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                # Ждём, пока изменения не перестанут поступать
+                while self.pending is not None and time.monotonic() < self.due_time:
+                    self.condition.wait(self.due_time - time.monotonic())
+                if self.pending is None:
+                    continue  # Изменения уже записал flush()
+                # Блокировку записи берём до того, как забрать снимок: flush(), увидев пустой pending, дождётся этой записи
+                self.write_lock.acquire()
+                snapshot = self.pending
+                self.pending = None
+            try:
+                write_settings_file(snapshot)
+            finally:
+                self.write_lock.release()
+
+    def write(self, snapshot):
+        with self.write_lock:
+            write_settings_file(snapshot)
+
+    def flush(self):
+        # Синхронно записывает отложенные изменения (при выходе из игры)
+        with self.condition:
+            snapshot = self.pending
+            self.pending = None
+        if snapshot is not None:
+            self.write(snapshot)
+        else:
+            with self.write_lock:
+                pass  # Дожидаемся записи, которая уже идёт в фоне
+
+settings_writer = SettingsWriter()
+atexit.register(settings_writer.flush)
+
+def save_settings(settings):
+    settings_writer.request(settings)
         
 def get_text(key, **kwargs):
     lang = settings.get('language', 'en')
@@ -79,8 +174,8 @@ def get_text(key, **kwargs):
             pass  # Если форматирование не удалось, возвращаем текст без изменений
     return text
 
-# Настройки
-settings = load_settings()
+# Настройки (загружаются из settings.cfg в bootstrap())
+settings = default_settings()
 
 # Цвет символа
 cursor_color = (218, 136, 245)
@@ -108,6 +203,31 @@ PLAYER_DAMAGE = 1  # Урон, наносимый игроком за удар
 DAMAGE_COOLDOWN = 400  # Кулдаун в миллисекундах для атак
 SHAKE_INTENSITY = 2  # Интенсивность тряски врага перед тем, как он станет красным
 INVULNERABILITY_DURATION = 600  # Продолжительность неуязвимости игрока в начале волны (в мс)
+PROJECTILE_LIFETIME = 1500  # Время жизни снаряда в мс
+COLLISION_DISTANCE_SQUARED = FONT_SIZE * FONT_SIZE  # Столкновения сравниваются по квадрату расстояния, без sqrt
+USE_SWARM_ENGINE = False  # Обновлять обычных врагов и стрелков пакетно через SwarmEngine (NumPy) (--swarm-engine)
+USE_AI_LOD = False  # Дальние враги пересчитывают движение по очереди, а между пересчётами летят по инерции (--ai-lod)
+AI_LOD_NEAR_DISTANCE = 300  # Ближе этого к игроку враг пересчитывает движение каждый шаг
+AI_LOD_SLICES = 4  # Дальний враг пересчитывает движение раз в столько шагов
+AI_LOD_FIRE_WARNING = 500  # За сколько мс до выстрела стрелок переходит на полное обновление
+AI_STEER_BUDGET = 150  # Сколько пересчётов движения дальних врагов допускается за шаг симуляции
+# Лимиты живых сущностей по категориям (см. EntityBudget): сверх лимита враги и снаряды ждут в очереди,
+# а числа урона сливаются с похожими или отбрасываются. Обычные волны до 66-й лимит врагов не задевают
+ENTITY_BUDGETS = {
+    'enemies': 200,
+    'projectiles': 2000,
+    'damage_numbers': 64
+}
+PROJECTILE_QUEUE_LIMIT = 1000  # Снаряды сверх лимита очереди отбрасываются
+USE_DIRTY_RECTS = False  # Выводить на экран только изменившиеся области (--dirty-rects)
+DIRTY_RECT_LIMIT = 200  # При большем числе областей дешевле вывести кадр целиком
+SIMULATION_TICK_RATE = 60  # Шагов игровой логики в секунду игрового времени
+SIMULATION_STEP_MS = 1000 / SIMULATION_TICK_RATE
+MAX_FRAME_TIME_MS = 250  # Больше за один кадр не догоняем, иначе после подвисания симуляция уйдёт в спираль
+RENDER_FPS_LIMIT = 240  # Отрисовка не привязана к шагу симуляции
+MENU_TICK_MS = 1000 // 60  # Как часто простаивающее меню просыпается ради хроматического глитча
+SMOOTH_UPSCALE = False  # smoothscale мягче, но при апскейле в 4K обходится дороже всего VHS прохода
+COUNTDOWN_IDLE_BUDGET_MS = 10  # Сколько мс каждого кадра отсчёта отдаётся сборке следующей волны
 
 # Локализация
 localization = {
@@ -126,6 +246,8 @@ localization = {
         'paused': 'Paused',
         'hold_to_menu': 'Hold Esc to return to menu.',
         'resolution': 'Resolution',
+        'render_resolution': 'Render Resolution',
+        'native': 'Native',
         'fullscreen_mode': 'Fullscreen Mode',
         'music_volume': 'Music Volume',
         'hit_volume': 'Hit Volume',
@@ -187,6 +309,8 @@ localization = {
         'paused': 'Пауза',
         'hold_to_menu': 'Удерживайте Esc для возврата в меню.',
         'resolution': 'Разрешение',
+        'render_resolution': 'Разрешение отрисовки',
+        'native': 'Как у экрана',
         'fullscreen_mode': 'Полноэкранный режим',
         'music_volume': 'Громкость музыки',
         'hit_volume': 'Громкость ударов',
@@ -262,39 +386,132 @@ shop_upgrades = [
     }
 ]
 
-# Инициализация Pygame и микшера для звука
-pygame.init()
-pygame.mixer.init()
-pygame.mixer.set_num_channels(16)
-
-# Глобальные переменные для экрана и шрифта
+# Игровые часы: по умолчанию идут вместе с pygame.time.get_ticks(),
+# а в безголовом режиме двигаются только фиксированными тиками симуляции
+class GameClock:
+    def __init__(self):
+        self.simulated_time = None  # None — реальное время
+
+    def get_ticks(self):
+        if self.simulated_time is None:
+            return pygame.time.get_ticks()
+        return self.simulated_time
+
+    def simulate(self, start_time=0):
+        self.simulated_time = start_time
+
+    def advance(self, milliseconds):
+        if self.simulated_time is not None:
+            self.simulated_time += milliseconds
+
+    def use_real_time(self):
+        self.simulated_time = None
+
+game_clock = GameClock()
+
+# Планировщик таймеров на двоичной куче по игровому времени
+# Сущность ставит себе время следующего пробуждения, и на шаге обрабатываются только те, чьё время пришло —
+# работа по отсчёту времени растёт с числом сработавших таймеров, а не с числом живых врагов
+TIMER_SLACK = 1e-6  # Будим на эту долю мс раньше: проверки вида now - start >= duration не пропустят шаг из-за округления
+
+class TimerScheduler:
+    def __init__(self):
+        self.heap = []  # (время, порядковый номер, сущность, токен)
+        self.sequence = 0
+        self.fired = 0  # Сколько таймеров сработало на последнем шаге
+
+    def clear(self):
+        self.heap.clear()
+
+    def schedule(self, entity, wake_time):
+        # Новое время заменяет прежнее: старые записи остаются в куче, но их токен уже не совпадёт
+        entity.timer_token += 1
+        if wake_time is not None:
+            self.sequence += 1
+            heapq.heappush(self.heap, (wake_time, self.sequence, entity, entity.timer_token))
+
+    def pop_due(self, current_time):
+        due = set()
+        heap = self.heap
+        while heap and heap[0][0] <= current_time + TIMER_SLACK:
+            _, _, entity, token = heapq.heappop(heap)
+            if token == entity.timer_token:
+                due.add(entity)
+        self.fired = len(due)
+        return due
+
+timers = TimerScheduler()
+
+# Глобальные переменные для экрана и шрифта (создаются в bootstrap())
+# screen — поверхность, в которую рисует игра; window — окно. Если разрешение отрисовки
+# совпадает с окном, это одна и та же поверхность, иначе кадр масштабируется в present_rect окна
 screen = None
+window = None
+present_rect = None
 font = None
-
-pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_NO)
+boss_font = None
+
+# Разрешения, доступные в настройках (и для окна, и для внутренней отрисовки)
+RESOLUTIONS = [
+    (1280, 720),
+    (1366, 768),
+    (1600, 768),
+    (1600, 900),
+]
 
 def apply_display_settings():
-    global screen, font, SCREEN_WIDTH, SCREEN_HEIGHT
-    SCREEN_WIDTH, SCREEN_HEIGHT = settings['resolution']
+    global screen, window, present_rect, font, SCREEN_WIDTH, SCREEN_HEIGHT
     
     flags = pygame.NOFRAME
     if settings['fullscreen']:
         # Получаем текущее разрешение дисплея пользователя
         infoObject = pygame.display.Info()
         display_resolution = (infoObject.current_w, infoObject.current_h)
-        screen = pygame.display.set_mode(display_resolution, flags | pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF)
-        SCREEN_WIDTH, SCREEN_HEIGHT = display_resolution  # Обновляем глобальные переменные
+        window = pygame.display.set_mode(display_resolution, flags | pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF)
+    else:
+        window = pygame.display.set_mode(settings['resolution'], flags | pygame.HWSURFACE | pygame.DOUBLEBUF)
+
+    render_resolution = settings['render_resolution'] or window.get_size()
+    if render_resolution == window.get_size():
+        screen = window
+        present_rect = None
     else:
-        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), flags | pygame.HWSURFACE | pygame.DOUBLEBUF)
+        # Игра рисует и симулирует во внутреннем разрешении, стоимость VHS эффектов не зависит от монитора
+        screen = pygame.Surface(render_resolution).convert(window)
+        # Вписываем кадр в окно с сохранением пропорций, по краям остаются чёрные поля
+        scale = min(window.get_width() / render_resolution[0], window.get_height() / render_resolution[1])
+        present_rect = pygame.Rect(0, 0, round(render_resolution[0] * scale), round(render_resolution[1] * scale))
+        present_rect.center = window.get_rect().center
+        window.fill(BACKGROUND_COLOR)
+    SCREEN_WIDTH, SCREEN_HEIGHT = screen.get_size()  # Обновляем глобальные переменные
     
     # Обновляем шрифт, если необходимо
     font = pygame.font.SysFont('Courier', FONT_SIZE)
+    glyph_cache.clear()  # Глифы старого шрифта больше не нужны
     
     # Сохраняем настройки
     save_settings(settings)
-    
-icon = pygame.Surface((32, 32), pygame.SRCALPHA)  # Создаем прозрачную поверхность
-pygame.display.set_icon(icon)
+
+def present_display(rects=None):
+    # Вывод кадра в окно: напрямую или с масштабированием внутреннего разрешения
+    if present_rect is None:
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+        return
+    # При масштабировании области не совпадают с пикселями окна — кадр выводится целиком
+    scale = pygame.transform.smoothscale if SMOOTH_UPSCALE else pygame.transform.scale
+    scale(screen, present_rect.size, window.subsurface(present_rect))
+    pygame.display.flip()
+
+def window_to_screen(pos):
+    # Перевод координат окна (мышь) в координаты внутреннего разрешения
+    if present_rect is None:
+        return pos
+    x = (pos[0] - present_rect.x) * SCREEN_WIDTH / present_rect.width
+    y = (pos[1] - present_rect.y) * SCREEN_HEIGHT / present_rect.height
+    return (min(max(int(x), 0), SCREEN_WIDTH - 1), min(max(int(y), 0), SCREEN_HEIGHT - 1))
 
 def apply_volume_settings():
     pygame.mixer.music.set_volume(settings['volume_music'])
@@ -310,108 +527,251 @@ def apply_volume_settings():
     ]
     for sound in other_sounds:
         sound.set_volume(settings['volume_other'])
+    boss_music.set_volume(settings['volume_music'])
     
     # Сохраняем настройки
     save_settings(settings)
     
 # Функция для создания цветовых сдвигов (chromatic aberration)
+# Каналы сдвигаются прямо в буфере поверхности, без копий экрана и новых поверхностей
+chromatic_scratch_cache = {}  # Рабочий массив одного канала для каждого размера экрана
+
+def roll_slices(shift, length):
+    # Пары срезов (куда, откуда), повторяющие np.roll со сдвигом shift
+    shift %= length
+    if shift == 0:
+        return [(slice(None), slice(None))]
+    return [(slice(shift, None), slice(None, length - shift)), (slice(None, shift), slice(length - shift, None))]
+
+def shift_color_channels(surface, shifts):
+    # shifts: ((rx, ry), (gx, gy), (bx, by)) — сдвиг каждого канала по осям x и y с заворотом
+    if not any(shift_x or shift_y for shift_x, shift_y in shifts):
+        return  # Все сдвиги нулевые — поверхность даже не блокируем
+    arr = pygame.surfarray.pixels3d(surface)
+    width, height = arr.shape[:2]
+    scratch = chromatic_scratch_cache.get((width, height))
+    if scratch is None:
+        scratch = np.empty((width, height), dtype=np.uint8)
+        chromatic_scratch_cache[(width, height)] = scratch
+
+    for channel, (shift_x, shift_y) in enumerate(shifts):
+        if not shift_x and not shift_y:
+            continue
+        channel_view = arr[:, :, channel]
+        scratch[...] = channel_view
+        for dst_x, src_x in roll_slices(shift_x, width):
+            for dst_y, src_y in roll_slices(shift_y, height):
+                channel_view[dst_x, dst_y] = scratch[src_x, src_y]
+
+    # Освобождаем блокировку поверхности
+    del channel_view, arr
+
+# Свой генератор для визуальных эффектов: число отрисованных кадров зависит от FPS,
+# и глитч не должен сдвигать общий random, от которого зависит симуляция (и повторы)
+vfx_random = random.Random()
+
+def roll_chromatic_shifts():
+    # Сдвиги каналов для этого кадра или None, если глитч не сработал
+    if vfx_random.randint(1, 15) == 5:
+        # Случайные сдвиги для каналов
+        shift_x, shift_y = vfx_random.randint(-1, 1), vfx_random.randint(-1, 1)
+        return (
+            (shift_x, shift_y),
+            (vfx_random.randint(-1, 1), vfx_random.randint(-1, 1)),
+            (vfx_random.randint(-1, 1), vfx_random.randint(-1, 1))
+        )
+    return None
+
 def chromatic_aberration(surface):
-    if random.randint(1, 15) == 5:
-        # Получаем массивы цветовых каналов только один раз
-        arr = pygame.surfarray.pixels3d(surface)
+    # Возвращает True, если в этом кадре сработал глитч
+    shifts = roll_chromatic_shifts()
+    if shifts is not None:
+        shift_color_channels(surface, shifts)
+        return True
+    return False
 
-        # Создаем копии каждого цветового канала
-        r_arr = arr[:,:,0].copy()
-        g_arr = arr[:,:,1].copy()
-        b_arr = arr[:,:,2].copy()
+# Атлас глифов: каждая тройка (символ, шрифт, цвет) растеризуется один раз
+glyph_cache = {}
 
-        # Случайные сдвиги для каналов
-        shift_x, shift_y = random.randint(-1, 1), random.randint(-1, 1)
-        r_arr = np.roll(r_arr, shift_x, axis=0)
-        r_arr = np.roll(r_arr, shift_y, axis=1)
-        g_arr = np.roll(g_arr, random.randint(-1, 1), axis=0)
-        g_arr = np.roll(g_arr, random.randint(-1, 1), axis=1)
-        b_arr = np.roll(b_arr, random.randint(-1, 1), axis=0)
-        b_arr = np.roll(b_arr, random.randint(-1, 1), axis=1)
-
-        # Собираем снова в одно изображение
-        result_surface = pygame.surfarray.make_surface(np.dstack([r_arr, g_arr, b_arr]))
-        return result_surface
-    else:
-        return surface
+def get_glyph(symbol, font, color):
+    key = (symbol, font, color)
+    glyph = glyph_cache.get(key)
+    if glyph is None:
+        glyph = font.render(symbol, True, color)
+        glyph_cache[key] = glyph
+    return glyph
 
 # Функция для создания горизонтальных полос (scanlines)
 scanline_surface_cache = {}
 
-def apply_scanlines(surface, intensity=30, alpha=151):
+def get_scanline_surface(size, intensity=30, alpha=151):
     # Кэширование поверхности с линиями
-    size = surface.get_size()
     if size not in scanline_surface_cache:
         scanline_surface = pygame.Surface(size, pygame.SRCALPHA)
         line_color = (intensity, intensity, intensity, alpha)
 
         # Рисуем линии через одну строку
-        for y in range(0, surface.get_height(), 2):
-            pygame.draw.line(scanline_surface, line_color, (0, y), (surface.get_width(), y), 1)
+        for y in range(0, size[1], 2):
+            pygame.draw.line(scanline_surface, line_color, (0, y), (size[0], y), 1)
         
         # Кэшируем результат
         scanline_surface_cache[size] = scanline_surface
     else:
         scanline_surface = scanline_surface_cache[size]
+    return scanline_surface
 
+def apply_scanlines(surface, intensity=30, alpha=151):
     # Накладываем полупрозрачные линии на исходную поверхность
-    surface.blit(scanline_surface, (0, 0))
-
-# Загрузка звуков из папки audio
-hit_sounds = [
-    pygame.mixer.Sound(os.path.join(base_path, 'audio', 'hit1.wav')),
-    pygame.mixer.Sound(os.path.join(base_path, 'audio', 'hit2.wav')),
-    pygame.mixer.Sound(os.path.join(base_path, 'audio', 'hit3.wav'))
-]
-damage_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'damage.wav'))
-error_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'error.wav'))
-level_up_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'level_up.wav'))
-exp_gain_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'exp_gain.wav'))
-health_pickup_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'health_pickup.wav'))
-upgrade_select_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'upgrade_select.wav'))
-shooter_fire_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'shooter_fire.wav'))
-countdown_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'countdown.wav'))
-game_over_sound = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'game_over.wav'))
-pygame.mixer.music.load(os.path.join(base_path, 'audio', 'background_music.wav'))
-
-shooter_fire_channel = pygame.mixer.Channel(5)
-music_channel = pygame.mixer.Channel(6)
-
-# Применение начальных настроек
-apply_display_settings()
-apply_volume_settings()
-
-# Воспроизведение фоновой музыки
-if not pygame.mixer.music.get_busy():
-    pygame.mixer.music.play(-1, 0.0)  # Цикл бесконечно
-
-# Загрузка музыки для боя с боссом
-boss_music = pygame.mixer.Sound(os.path.join(base_path, 'audio', 'boss_theme.wav'))
-boss_music.set_volume(settings['volume_music'])
-
-# Установка заголовка окна
-pygame.display.set_caption('Ākēdo')
-
-# Настройка шрифтов
-font = pygame.font.SysFont('Courier', FONT_SIZE)
-boss_font = pygame.font.SysFont('Courier', FONT_SIZE, bold=True)
+    surface.blit(get_scanline_surface(surface.get_size(), intensity, alpha), (0, 0))
+
+# Применение VHS эффектов прямо в буфере экрана
+def apply_vhs_effects(surface):
+    glitched = chromatic_aberration(surface)
+    apply_scanlines(surface)
+    return glitched
+
+# Звук, который декодируется при первом обращении или заранее в фоновом потоке
+# Громкость запоминается и применяется, даже если звук ещё не загружен
+class LazySound:
+    def __init__(self, filename, volume=1.0):
+        self.path = os.path.join(base_path, 'audio', filename)
+        self.volume = volume
+        self.sound = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self.sound is not None
+
+    def get(self):
+        if self.sound is None:
+            with self.lock:
+                if self.sound is None:  # Фоновый поток мог загрузить звук, пока мы ждали
+                    sound = pygame.mixer.Sound(self.path)
+                    sound.set_volume(self.volume)
+                    self.sound = sound
+        return self.sound
+
+    def load_in_background(self):
+        load_sounds_in_background([self])
+
+    def set_volume(self, volume):
+        # Под той же блокировкой, что и загрузка: иначе фоновый поток может применить к звуку старую громкость
+        with self.lock:
+            self.volume = volume
+            if self.sound is not None:
+                self.sound.set_volume(volume)
+
+    def play(self, *args):
+        return self.get().play(*args)
+
+    def stop(self):
+        if self.sound is not None:
+            self.sound.stop()
+
+def load_sounds_in_background(sounds):
+    thread = threading.Thread(target=lambda: [sound.get() for sound in sounds], daemon=True)
+    thread.start()
+    return thread
+
+# Звуки из папки audio
+hit_sounds = [LazySound('hit1.wav'), LazySound('hit2.wav'), LazySound('hit3.wav')]
+damage_sound = LazySound('damage.wav')
+error_sound = LazySound('error.wav')
+level_up_sound = LazySound('level_up.wav')
+exp_gain_sound = LazySound('exp_gain.wav')
+health_pickup_sound = LazySound('health_pickup.wav')
+upgrade_select_sound = LazySound('upgrade_select.wav')
+shooter_fire_sound = LazySound('shooter_fire.wav')
+countdown_sound = LazySound('countdown.wav')
+game_over_sound = LazySound('game_over.wav')
+# Музыка босса загружается во время отсчёта перед боссовой волной
+boss_music = LazySound('boss_theme.wav', settings['volume_music'])
+
+shooter_fire_channel = None  # Каналы микшера создаются на этапе audio
+music_channel = None
 
 # Инициализация часов
 clock = pygame.time.Clock()
 
-# Скрываем стандартный курсор
-pygame.mouse.set_visible(False)
+# Этапы запуска игры; импорт модуля сам ничего не инициализирует
+def init_settings():
+    settings.update(load_settings())
+
+def init_display():
+    # pygame.init() заодно открыл бы аудиоустройство, поэтому модули поднимаются по отдельности
+    pygame.display.init()
+    pygame.font.init()
+    pygame.time.delay(0)  # Запускает таймер SDL для pygame.time.get_ticks()
+    if pygame.display.get_driver() not in ('dummy', 'offscreen'):  # Без окна системных курсоров нет
+        pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_NO)
+    icon = pygame.Surface((32, 32), pygame.SRCALPHA)  # Создаем прозрачную поверхность
+    pygame.display.set_icon(icon)
+    apply_display_settings()
+    # Установка заголовка окна
+    pygame.display.set_caption('Ākēdo')
+    # Скрываем стандартный курсор
+    pygame.mouse.set_visible(False)
+
+def init_fonts():
+    global boss_font
+    boss_font = pygame.font.SysFont('Courier', FONT_SIZE, bold=True)
+
+def init_audio():
+    global shooter_fire_channel, music_channel
+    pygame.mixer.init()
+    pygame.mixer.set_num_channels(16)
+    shooter_fire_channel = pygame.mixer.Channel(5)
+    music_channel = pygame.mixer.Channel(6)
+    pygame.mixer.music.load(os.path.join(base_path, 'audio', 'background_music.wav'))  # Фоновая музыка стримится, а не декодируется целиком
+    apply_volume_settings()
+
+    # Звуки меню нужны сразу, игровые догружаются в фоне, пока игрок в меню
+    upgrade_select_sound.get()
+    error_sound.get()
+    load_sounds_in_background(hit_sounds + [damage_sound, level_up_sound, exp_gain_sound, health_pickup_sound,
+                                            shooter_fire_sound, countdown_sound, game_over_sound])
+
+    # Воспроизведение фоновой музыки
+    if not pygame.mixer.music.get_busy():
+        pygame.mixer.music.play(-1, 0.0)  # Цикл бесконечно
+
+def run_stage(name, stage):
+    started = time.perf_counter()
+    stage()
+    startup_timings.append((name, (time.perf_counter() - started) * 1000))
+
+def bootstrap(headless=False):
+    global bootstrap_finished_time
+    # Безголовый режим: драйверы SDL нужно выбрать до инициализации pygame
+    if headless:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    startup_timings.append(('imports', (time.perf_counter() - launch_time) * 1000))
+    run_stage('settings', init_settings)
+    run_stage('display', init_display)
+    run_stage('fonts', init_fonts)
+    run_stage('audio', init_audio)
+    bootstrap_finished_time = time.perf_counter()
+
+def print_startup_report():
+    for name, milliseconds in startup_timings:
+        print(f'{name:<12} {milliseconds:8.1f} ms')
+    if first_frame_time is not None:
+        print(f"{'total':<12} {(first_frame_time - launch_time) * 1000:8.1f} ms")
+
 
 # Класс игрока
 class Player:
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'level', 'exp', 'exp_to_level_up', 'hp', 'max_hp', 'speed', 'damage', 'defense',
+                 'last_hit_time', 'last_damage_taken', 'hp_upgrade_count', 'defense_upgrade_count', 'health_pickup_heal_amount',
+                 'choose_upgrade', 'total_exp', 'total_damage_taken')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x  # Позиция на предыдущем шаге симуляции (для интерполяции отрисовки)
+        self.prev_y = y
         self.level = 1
         self.exp = 0
         self.exp_to_level_up = 10
@@ -420,10 +780,13 @@ class Player:
         self.speed = 1
         self.damage = PLAYER_DAMAGE
         self.defense = 0.0
-        self.last_hit_time = pygame.time.get_ticks()  # Время последнего удара
+        self.last_hit_time = game_clock.get_ticks()  # Время последнего удара
         self.hp_upgrade_count = 0  # Количество улучшений HP
         self.defense_upgrade_count = 0  # Количество улучшений защиты
         self.health_pickup_heal_amount = 1  # Начальное количество восстанавливаемого HP аптечкой
+        self.choose_upgrade = upgrade_menu  # Выбор улучшения при повышении уровня (меню или скрипт)
+        self.total_exp = 0  # Статистика забега
+        self.total_damage_taken = 0
         
         # Применение купленных улучшений
         if 'glass_cannon' in settings['purchased_upgrades']:
@@ -445,7 +808,8 @@ class Player:
 
     def gain_exp(self, amount):
         self.exp += round(amount, 1)  # Округление опыта до одного десятичного
-        pygame.mixer.Sound.play(exp_gain_sound)  # Воспроизведение звука получения опыта
+        self.total_exp += round(amount, 1)
+        exp_gain_sound.play()  # Воспроизведение звука получения опыта
         while self.exp >= self.exp_to_level_up:
             self.level_up()
 
@@ -453,22 +817,23 @@ class Player:
         self.level += 1
         self.exp -= self.exp_to_level_up
         self.exp_to_level_up += 10  # Увеличение требования к опыту с каждым уровнем
-        pygame.mixer.Sound.play(level_up_sound)  # Воспроизведение звука повышения уровня
-        upgrade_menu(self)  # Вызов меню улучшений при повышении уровня
+        level_up_sound.play()  # Воспроизведение звука повышения уровня
+        self.choose_upgrade(self)  # Вызов меню улучшений при повышении уровня
 
     def apply_damage(self, damage):
-        current_time = pygame.time.get_ticks()
+        current_time = game_clock.get_ticks()
 
         # Защита уменьшает урон на 0.2 за каждое улучшение
         damage_reduction = 0.2 * self.defense_upgrade_count
         actual_damage = max(0.1, damage - damage_reduction)  # Урон не может быть меньше 0.1
         self.hp -= actual_damage
         self.last_damage_taken = actual_damage  # Сохраняем фактический урон для отображения
+        self.total_damage_taken += actual_damage
         if self.hp <= 0:
             self.hp = 0
-            pygame.mixer.Sound.play(damage_sound)
+            damage_sound.play()
             return True  # Сигнализирует о смерти игрока
-        pygame.mixer.Sound.play(damage_sound)
+        damage_sound.play()
         return False
 
     def heal(self, amount):
@@ -477,94 +842,407 @@ class Player:
 
 # Класс аптечки здоровья
 class HealthPickup:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
 
-    def draw(self, surface):
-        draw_text(HEALTH_SYMBOL, font, HEALTH_COLOR, self.x, self.y)
+    def draw(self, batch):
+        queue_glyph(batch, HEALTH_SYMBOL, font, HEALTH_COLOR, self.x, self.y)
 
     def is_colliding(self, player):
-        return math.sqrt((player.x - self.x) ** 2 + (player.y - self.y) ** 2) < FONT_SIZE
+        return (player.x - self.x) ** 2 + (player.y - self.y) ** 2 < COLLISION_DISTANCE_SQUARED
 
-# Класс снаряда
+# Класс снаряда (описание одного выстрела; живые снаряды хранятся в ProjectileStore)
 class Projectile:
+    __slots__ = ('x', 'y', 'dx', 'dy', 'damage', 'start_time', 'follow_player')
+    lifetime = PROJECTILE_LIFETIME  # Снаряды существуют 1.5 секунды
+    speed = 3  # Начальная скорость снаряда
+
     def __init__(self, x, y, dx, dy, damage, follow_player=False):
         self.x = x
         self.y = y
         self.dx = dx
         self.dy = dy
         self.damage = damage  # Урон снаряда
-        self.lifetime = 1500  # Снаряды существуют 1.5 секунды
-        self.speed = 3  # Начальная скорость снаряда
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = game_clock.get_ticks()
         self.follow_player = follow_player  # Следовать за игроком
 
-    def update(self, player_x=None, player_y=None):
-        elapsed_time = pygame.time.get_ticks() - self.start_time
-        if elapsed_time > self.lifetime:
-            return False  # Снаряд исчезает
-        self.speed = max(self.speed - 0.019, 0)  # Постепенное замедление снаряда
-
-        if self.follow_player and player_x is not None and player_y is not None:
-            # Если снаряд должен следовать за игроком
-            dx = player_x - self.x
-            dy = player_y - self.y
-            distance = math.sqrt(dx ** 2 + dy ** 2)
-            if distance > 0:
-                self.dx = dx / distance
-                self.dy = dy / distance
-
-        self.x += self.dx * self.speed
-        self.y += self.dy * self.speed
-        return True
+# Кэш спрайтов снаряда по размеру шрифта (масштаб 1.0–1.5 даёт всего 15 размеров)
+projectile_sprite_cache = {}
+
+def get_projectile_sprite(size):
+    sprite = projectile_sprite_cache.get(size)
+    if sprite is None:
+        sprite = pygame.font.Font(None, size).render(PROJECTILE_SYMBOL, True, PROJECTILE_COLOR)
+        projectile_sprite_cache[size] = sprite
+    return sprite
+
+# Хранилище снарядов: по массиву NumPy на поле, обновление и удаление за один векторный проход
+# Снаряды добавляются в момент выстрела и keep() сохраняет порядок, поэтому start_time не убывает —
+# истёкшие снаряды всегда лежат в начале массивов
+PROJECTILE_FIELDS = {
+    'x': np.float64,
+    'y': np.float64,
+    'prev_x': np.float64,  # Позиция на предыдущем шаге симуляции
+    'prev_y': np.float64,
+    'dx': np.float64,
+    'dy': np.float64,
+    'speed': np.float64,
+    'start_time': np.float64,
+    'damage': np.float64,
+    'follow_player': np.bool_
+}
+
+class ProjectileStore:
+    def __init__(self, capacity=256, budget=None):
+        self.capacity = capacity
+        self.count = 0
+        self.budget = budget  # EntityBudget забега; None — без лимита
+        for name, dtype in PROJECTILE_FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self):
+        return self.count
+
+    def grow(self, required):
+        while self.capacity < required:
+            self.capacity *= 2
+        for name, dtype in PROJECTILE_FIELDS.items():
+            array = np.zeros(self.capacity, dtype=dtype)
+            array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+
+    def add(self, x, y, dx, dy, damage, follow_player=False, start_time=None):
+        # Пока в очереди кто-то ждёт, новый снаряд встаёт за ними, даже если место уже освободилось
+        if self.budget is not None and (self.count >= self.budget.limits['projectiles'] or self.budget.projectile_queue):
+            self.budget.queue_projectiles([(x, y, dx, dy, damage, follow_player)])
+            return
+        self.insert(x, y, dx, dy, damage, follow_player, start_time)
+
+    def insert(self, x, y, dx, dy, damage, follow_player=False, start_time=None):
+        # Добавление без проверки лимита (им пользуется и выпуск снарядов из очереди)
+        if self.count == self.capacity:
+            self.grow(self.count + 1)
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.dx[i] = dx
+        self.dy[i] = dy
+        self.speed[i] = 3  # Начальная скорость снаряда
+        self.start_time[i] = game_clock.get_ticks() if start_time is None else start_time
+        self.damage[i] = damage
+        self.follow_player[i] = follow_player
+        self.count += 1
+
+    def add_many(self, x, y, dx, dy, damage, follow_player=False):
+        # Пакетное добавление: один срез на поле вместо цикла по снарядам
+        k = len(dx)
+        if self.budget is not None and (self.count + k > self.budget.limits['projectiles'] or self.budget.projectile_queue):
+            # Часть залпа, не уместившаяся в лимит, ждёт в очереди (весь залп — если очередь не пуста)
+            room = 0 if self.budget.projectile_queue else max(0, self.budget.limits['projectiles'] - self.count)
+            self.budget.queue_projectiles([(x, y, queued_dx, queued_dy, damage, follow_player)
+                                           for queued_dx, queued_dy in zip(dx[room:].tolist(), dy[room:].tolist())])
+            dx = dx[:room]
+            dy = dy[:room]
+            k = room
+        if not k:
+            return
+        if self.count + k > self.capacity:
+            self.grow(self.count + k)
+        i, j = self.count, self.count + k
+        self.x[i:j] = self.prev_x[i:j] = x
+        self.y[i:j] = self.prev_y[i:j] = y
+        self.dx[i:j] = dx
+        self.dy[i:j] = dy
+        self.speed[i:j] = 3
+        self.start_time[i:j] = game_clock.get_ticks()
+        self.damage[i:j] = damage
+        self.follow_player[i:j] = follow_player
+        self.count = j
+
+    def append(self, projectile):
+        # Совместимость со списком: враги и босс продолжают создавать объекты Projectile
+        self.add(projectile.x, projectile.y, projectile.dx, projectile.dy, projectile.damage,
+                 projectile.follow_player, projectile.start_time)
+
+    def keep(self, mask):
+        # Оставляем только снаряды, отмеченные маской (порядок сохраняется)
+        kept = int(mask.sum())
+        if kept == self.count:
+            return
+        for name in PROJECTILE_FIELDS:
+            array = getattr(self, name)
+            array[:kept] = array[:self.count][mask]
+        self.count = kept
+
+    def expire(self, current_time):
+        # Удаляет снаряды, прожившие дольше PROJECTILE_LIFETIME; пока старейший жив, это одно сравнение
+        n = self.count
+        start_time = self.start_time
+        if not n or current_time - start_time[0] <= PROJECTILE_LIFETIME:
+            return
+        # Двоичный поиск первого живого снаряда по той же проверке, что и раньше
+        expired = bisect.bisect_left(range(n), True, key=lambda i: current_time - start_time[i] <= PROJECTILE_LIFETIME)
+        for name in PROJECTILE_FIELDS:
+            array = getattr(self, name)
+            array[:n - expired] = array[expired:n]
+        self.count = n - expired
+
+    def save_positions(self):
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def update(self, player_x, player_y):
+        # Снаряды, прожившие дольше PROJECTILE_LIFETIME, исчезают
+        self.expire(game_clock.get_ticks())
+        # Очередь выпускается и в пустое хранилище — иначе она ждала бы следующего выстрела
+        if self.budget is not None and self.budget.projectile_queue:
+            self.budget.release_projectiles(self)
+        n = self.count
+        if not n:
+            return
+        speed = self.speed[:n]
+        np.maximum(speed - 0.019, 0, out=speed)  # Постепенное замедление снаряда
+
+        # Самонаводящиеся снаряды поворачивают к игроку
+        homing = np.flatnonzero(self.follow_player[:n])
+        if len(homing):
+            to_player_x = player_x - self.x[homing]
+            to_player_y = player_y - self.y[homing]
+            distance = np.sqrt(to_player_x ** 2 + to_player_y ** 2)
+            moving = distance > 0
+            self.dx[homing[moving]] = to_player_x[moving] / distance[moving]
+            self.dy[homing[moving]] = to_player_y[moving] / distance[moving]
+
+        self.x[:n] += self.dx[:n] * speed
+        self.y[:n] += self.dy[:n] * speed
+
+    def pop_hits(self, player):
+        # Урон снарядов, попавших в игрока (в порядке появления); сами снаряды удаляются
+        n = self.count
+        if not n:
+            return []
+        hit = (player.x - self.x[:n]) ** 2 + (player.y - self.y[:n]) ** 2 < COLLISION_DISTANCE_SQUARED
+        if not hit.any():
+            return []
+        damages = self.damage[:n][hit].tolist()
+        self.keep(~hit)
+        return damages
+
+    def draw(self, batch, alpha=1.0):
+        n = self.count
+        if not n:
+            return
+        elapsed_time = game_clock.get_ticks() - self.start_time[:n]
 
-    def draw(self, surface):
-        elapsed_time = pygame.time.get_ticks() - self.start_time
-        
         # Время для увеличения и уменьшения
         grow_duration = 300  # Время увеличения снаряда (300 мс)
         shrink_duration = 500  # Время уменьшения снаряда (500 мс)
-        final_shrink_start = self.lifetime - shrink_duration
-
-        # Рассчитаем размер снаряда в зависимости от времени
-        if elapsed_time < grow_duration:
-            scale = 1 + (elapsed_time / grow_duration) * 0.5  # Увеличивается на 50%
-        elif elapsed_time > final_shrink_start:
-            shrink_factor = (self.lifetime - elapsed_time) / shrink_duration
-            scale = 1 + 0.5 * shrink_factor  # Уменьшение в последние 500 мс
-        else:
-            scale = 1.5  # Стандартный размер после увеличения
-
-        # Создаем шрифт с изменённым размером
-        dynamic_font = pygame.font.Font(None, int(FONT_SIZE * scale))
-
-        # Отрисуем снаряд с учетом нового размера
-        draw_text(PROJECTILE_SYMBOL, dynamic_font, PROJECTILE_COLOR, int(self.x), int(self.y))
+        final_shrink_start = PROJECTILE_LIFETIME - shrink_duration
+
+        # Размер снаряда в зависимости от времени: рост на 50%, затем уменьшение в последние 500 мс
+        scale = np.where(elapsed_time < grow_duration, 1 + (elapsed_time / grow_duration) * 0.5,
+                         np.where(elapsed_time > final_shrink_start,
+                                  1 + 0.5 * (PROJECTILE_LIFETIME - elapsed_time) / shrink_duration, 1.5))
+        sizes = (FONT_SIZE * scale).astype(int).tolist()
+        x = self.prev_x[:n] + (self.x[:n] - self.prev_x[:n]) * alpha
+        y = self.prev_y[:n] + (self.y[:n] - self.prev_y[:n]) * alpha
+        positions = zip(x.astype(int).tolist(), y.astype(int).tolist())
+        batch.extend((get_projectile_sprite(size), position) for size, position in zip(sizes, positions))
+
+# Узоры пуль описываются данными; направления считаются один раз на узор и дальше выпускаются пачкой в ProjectileStore
+#   ring — count пуль равномерно по кругу, начиная с угла angle (градусы)
+#   spiral — круг разбит на steps направлений, за шаг выпускается arms пуль, сдвинутых на step
+#   aimed_burst — count пуль (число или диапазон) в цель со случайным разбросом jitter пикселей
+# Новая атака босса — это запись здесь и её имя в фазах босса (см. Boss.execute_attack)
+BULLET_PATTERNS = {
+    'explode_shot': {'kind': 'ring', 'count': 15},
+    'burst_shot': {'kind': 'aimed_burst', 'count': (5, 10), 'jitter': 25},
+    'laser_beam': {'kind': 'spiral', 'steps': 100, 'arms': 1},  # Кнут: π/2 рад/с при шаге 40 мс — оборот за 100 шагов
+    'suicide_explosion': {'kind': 'ring', 'count': 6}  # Число пуль задаёт волна смертника
+}
 
-    def is_colliding(self, player):
-        return math.sqrt((player.x - self.x) ** 2 + (player.y - self.y) ** 2) < FONT_SIZE
+# Кэш таблиц направлений: (узор, число пуль) -> (dx, dy)
+pattern_direction_cache = {}
+
+def get_pattern_directions(name, count=None):
+    pattern = BULLET_PATTERNS[name]
+    count = count or pattern.get('count') or pattern['steps']
+    key = (name, count)
+    directions = pattern_direction_cache.get(key)
+    if directions is None:
+        start = pattern.get('angle', 0)
+        angles = [math.radians(start + i * (360 / count)) for i in range(count)]
+        directions = (np.array([math.cos(angle) for angle in angles]), np.array([math.sin(angle) for angle in angles]))
+        pattern_direction_cache[key] = directions
+    return directions
+
+def emit_pattern(projectiles, name, x, y, damage, target=None, count=None, step=0):
+    # Выпускает узор name из точки (x, y); target — точка прицеливания для aimed_burst,
+    # step — номер шага для spiral. Возвращает число выпущенных пуль
+    pattern = BULLET_PATTERNS[name]
+    kind = pattern['kind']
+    if kind == 'ring':
+        dx, dy = get_pattern_directions(name, count)
+    elif kind == 'spiral':
+        table_x, table_y = get_pattern_directions(name)
+        steps = len(table_x)
+        indices = (step + np.arange(pattern['arms']) * (steps // pattern['arms'])) % steps
+        dx, dy = table_x[indices], table_y[indices]
+    else:
+        count = count or pattern['count']
+        if isinstance(count, tuple):
+            count = random.randint(*count)
+        jitter = pattern['jitter']
+        # Разброс генерируется по порядку (dx, dy, dx, dy, ...) — последовательность random не меняется
+        offsets = np.array([random.uniform(-jitter, jitter) for _ in range(2 * count)]).reshape(count, 2)
+        dx = target[0] - x + offsets[:, 0]
+        dy = target[1] - y + offsets[:, 1]
+        distance = np.sqrt(dx ** 2 + dy ** 2)
+        aimed = distance > 0
+        dx = dx[aimed] / distance[aimed]
+        dy = dy[aimed] / distance[aimed]
+    projectiles.add_many(x, y, dx, dy, damage)
+    return len(dx)
+
+# Равномерная пространственная сетка для поиска соседей врагов
+# Размер ячейки равен FONT_SIZE, поэтому все враги ближе FONT_SIZE лежат в соседних 3x3 ячейках
+class SpatialHash:
+    def __init__(self, cell_size=FONT_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # Ячейка -> список сущностей
+        self.entity_cells = {}  # Сущность -> ячейка, в которой она сейчас лежит
+        self.order = {}  # Сущность -> индекс в исходном списке (для стабильного порядка обхода)
+
+    def cell_of(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def rebuild(self, entities):
+        # Полная перестройка сетки (раз в кадр)
+        self.cells.clear()
+        self.entity_cells.clear()
+        self.order.clear()
+        for entity in entities:
+            self.update(entity)
+
+    def update(self, entity):
+        # Перенос сущности в актуальную ячейку после перемещения
+        cell = self.cell_of(entity.x, entity.y)
+        old_cell = self.entity_cells.get(entity)
+        if old_cell == cell:
+            return
+        if old_cell is None:
+            self.order[entity] = len(self.order)
+        else:
+            self.cells[old_cell].remove(entity)
+        self.cells.setdefault(cell, []).append(entity)
+        self.entity_cells[entity] = cell
+
+    def remove(self, entity):
+        # Индекс порядка не освобождаем, чтобы не выдать его повторно до следующей перестройки
+        cell = self.entity_cells.pop(entity, None)
+        if cell is not None:
+            self.cells[cell].remove(entity)
+
+    def nearby(self, x, y):
+        # Сущности из соседних ячеек в том же порядке, что и в исходном списке
+        cell_x, cell_y = self.cell_of(x, y)
+        result = []
+        for gx in (cell_x - 1, cell_x, cell_x + 1):
+            for gy in (cell_y - 1, cell_y, cell_y + 1):
+                bucket = self.cells.get((gx, gy))
+                if bucket:
+                    result.extend(bucket)
+        result.sort(key=self.order.__getitem__)
+        return result
+
+# Планировщик ИИ с двумя уровнями детализации. Враги рядом с игроком, босс и все, кто трясётся, покраснел,
+# делает рывок или вот-вот выстрелит, пересчитывают движение каждый шаг. Дальние — по очереди раз в
+# AI_LOD_SLICES шагов и не больше AI_STEER_BUDGET за шаг, а в остальные шаги летят по последнему вектору.
+# Бюджет считается в пересчётах, а не в миллисекундах: иначе безголовые забеги и повторы зависели бы от машины.
+# Таймеры врагов (update, shoot) сюда не входят: их будит куча timers по next_wake(), а этот планировщик касается только движения
+class AIScheduler:
+    def __init__(self, near_distance=AI_LOD_NEAR_DISTANCE, slices=AI_LOD_SLICES, steer_budget=AI_STEER_BUDGET):
+        self.near_distance_squared = near_distance * near_distance
+        self.slices = slices
+        self.steer_budget = steer_budget
+        self.next_phase = 0  # Новые дальние враги разносятся по разным шагам очереди
+        self.steered = 0
+        self.stats = Counter()  # full / sliced / coasted / deferred за последний шаг
+
+    def begin_step(self):
+        self.steered = 0
+        self.stats.clear()
+
+    def needs_full_update(self, enemy, player_x, player_y, current_time):
+        if enemy.is_boss or enemy.shaking or enemy.color == ENEMY_COLOR:
+            return True
+        if isinstance(enemy, RusherEnemy) and enemy.rushing:
+            return True
+        if enemy.is_shooter and current_time - enemy.last_shot_time > enemy.shoot_cooldown - AI_LOD_FIRE_WARNING:
+            return True
+        return (enemy.x - player_x) ** 2 + (enemy.y - player_y) ** 2 < self.near_distance_squared
+
+    def move(self, enemy, player_x, player_y, enemy_grid):
+        if self.needs_full_update(enemy, player_x, player_y, game_clock.get_ticks()):
+            enemy.ai_wait = 0  # Когда враг снова станет дальним, он пересчитается первым
+            enemy.move_towards_player(player_x, player_y, enemy_grid)
+            self.stats['full'] += 1
+            return
+        if enemy.ai_wait is None:
+            enemy.ai_wait = self.next_phase
+            self.next_phase = (self.next_phase + 1) % self.slices
+        if enemy.ai_wait <= 0 and self.steered < self.steer_budget:
+            enemy.move_towards_player(player_x, player_y, enemy_grid)
+            enemy.ai_wait = self.slices - 1
+            self.steered += 1
+            self.stats['sliced'] += 1
+        else:
+            # Враг, не уложившийся в бюджет, остаётся первым в очереди на следующий шаг
+            self.stats['deferred' if enemy.ai_wait <= 0 else 'coasted'] += 1
+            enemy.ai_wait -= 1
+            enemy.coast()
 
 # Класс врага (включая стрелков)
+# Сущности хранят поля в __slots__ без словаря экземпляра; неизменные параметры типа (символ, длительности,
+# таблицы фаз) — общие атрибуты класса
 class Enemy:
+    __slots__ = ('x', 'y', 'prev_x', 'prev_y', 'hp', 'damage', 'color', 'damage_timer', 'damage_due', 'red_duration',
+                 'last_hit_time', 'is_dead', 'shaking', 'shake_start_time', 'is_shooter', 'shoot_cooldown', 'last_shot_time',
+                 'preferred_distance', 'steer_x', 'steer_y', 'ai_wait', 'timer_token')
+    is_boss = False  # Дешёвая проверка вместо isinstance(enemy, Boss) в горячих циклах
+    timer_driven = True  # update() вызывается только по таймерам из timers, а не на каждом шаге
+
     def __init__(self, x, y, is_shooter=False, wave=1):
         self.x = x
         self.y = y
+        self.prev_x = x  # Позиция на предыдущем шаге симуляции (для интерполяции отрисовки)
+        self.prev_y = y
         base_hp = 3
         base_damage = 1
         self.hp = base_hp * (1 + 0.05 * (wave - 1))  # Враги становятся сильнее с каждой волной
         self.damage = base_damage * (1 + 0.05 * (wave - 1))  # Урон врагов увеличивается с волнами
         self.color = ENEMY_DEFAULT_COLOR
         self.damage_timer = random.randint(1000, 3000) + random.randint(0, 5000)  # Случайный таймер
+        self.damage_due = game_clock.get_ticks() + self.damage_timer  # Когда таймер истечёт
         self.red_duration = random.randint(1500, 2500)  # Как долго враг остается красным
-        self.last_hit_time = pygame.time.get_ticks()
+        self.last_hit_time = game_clock.get_ticks()
         self.is_dead = False
         self.shaking = False
         self.shake_start_time = 0
         self.is_shooter = is_shooter  # Является ли враг стрелком?
         self.shoot_cooldown = random.randint(1500, 4500) if is_shooter else None  # Кулдаун между выстрелами для стрелков
-        self.last_shot_time = pygame.time.get_ticks() if is_shooter else None
+        self.last_shot_time = game_clock.get_ticks() if is_shooter else None
         self.preferred_distance = random.randint(150, 250)  # Предпочтительное расстояние до игрока
+        self.steer_x = 0  # Последний шаг движения к игроку — по нему враг летит, пока AIScheduler его не пересчитывает
+        self.steer_y = 0
+        self.ai_wait = None  # Сколько шагов дальний враг ещё летит по инерции (None — ещё не попадал в очередь)
+        self.timer_token = 0
+        if self.timer_driven:
+            timers.schedule(self, game_clock.get_ticks())  # Первый update() — на ближайшем шаге
 
     def move_towards_player(self, player_x, player_y, enemies):
         dx = player_x - self.x
@@ -594,16 +1272,22 @@ class Enemy:
 
         # Корректировка движения для избегания наложения с другими врагами
         move_x, move_y = self.avoid_collisions(move_x, move_y, enemies)
+        self.steer_x, self.steer_y = move_x, move_y
+        self.coast()
 
+    def coast(self):
         # Перемещение врага
-        self.x += move_x
-        self.y += move_y
+        self.x += self.steer_x
+        self.y += self.steer_y
 
         # Ограничение позиции врага в пределах границ экрана
         self.x = max(0, min(self.x, SCREEN_WIDTH - FONT_SIZE))
         self.y = max(0, min(self.y, SCREEN_HEIGHT - FONT_SIZE))
 
     def avoid_collisions(self, move_x, move_y, enemies):
+        # Вместо полного списка можно передать сетку — тогда проверяются только соседи
+        if isinstance(enemies, SpatialHash):
+            enemies = enemies.nearby(self.x, self.y)
         for other in enemies:
             if other != self:
                 dist_to_other = math.sqrt((other.x - self.x) ** 2 + (other.y - self.y) ** 2)
@@ -628,7 +1312,7 @@ class Enemy:
         return move_x, move_y
 
     def is_colliding(self, other):
-        return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2) < FONT_SIZE
+        return (self.x - other.x) ** 2 + (self.y - other.y) ** 2 < COLLISION_DISTANCE_SQUARED
 
     def knockback(self, player_x, player_y):
         dx = self.x - player_x
@@ -660,14 +1344,7 @@ class Enemy:
         if not self.is_shooter:
             return None  # Только стрелки стреляют
 
-        if 'curse_of_invisibility' in settings['purchased_upgrades']:
-            follow_player = False
-            damage_multiplier = 5
-        else:
-            follow_player = True
-            damage_multiplier = 1
-
-        current_time = pygame.time.get_ticks()
+        current_time = game_clock.get_ticks()
 
         # Проверяем, прошло ли достаточно времени с последнего выстрела
         if current_time - self.last_shot_time > self.shoot_cooldown:
@@ -681,36 +1358,45 @@ class Enemy:
                     self.shaking = False  # Прекращаем тряску
                     self.last_shot_time = current_time  # Обновляем время последнего выстрела
 
-                    # Вычисляем направление выстрела
-                    dx = player_x - self.x
-                    dy = player_y - self.y
-                    distance = math.sqrt(dx ** 2 + dy ** 2)
-                    if distance > 0:
-                        if not shooter_fire_channel.get_busy():
-                            shooter_fire_channel.play(shooter_fire_sound)
-                        return Projectile(self.x, self.y, dx / distance, dy / distance, self.damage * damage_multiplier, follow_player=follow_player)
+                    return self.fire_projectile(player_x, player_y)
 
         return None
 
-    def update(self, delta_time):
-        self.damage_timer -= delta_time
+    def fire_projectile(self, player_x, player_y):
+        if 'curse_of_invisibility' in settings['purchased_upgrades']:
+            follow_player = False
+            damage_multiplier = 5
+        else:
+            follow_player = True
+            damage_multiplier = 1
+
+        # Вычисляем направление выстрела
+        dx = player_x - self.x
+        dy = player_y - self.y
+        distance = math.sqrt(dx ** 2 + dy ** 2)
+        if distance > 0:
+            if not shooter_fire_channel.get_busy():
+                shooter_fire_channel.play(shooter_fire_sound.get())
+            return Projectile(self.x, self.y, dx / distance, dy / distance, self.damage * damage_multiplier, follow_player=follow_player)
+        return None
 
+    def update(self, delta_time):
         # Логика тряски для стрелков
         if self.is_shooter and self.shaking:
-            elapsed = pygame.time.get_ticks() - self.shake_start_time
+            elapsed = game_clock.get_ticks() - self.shake_start_time
             if elapsed < 500:  # Тряска продолжается 500 мс
                 self.x += random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
                 self.y += random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
             # Не сбрасываем self.shaking здесь; метод shoot() обрабатывает это
 
-        if self.damage_timer <= 0 and not self.shaking:
+        if game_clock.get_ticks() + TIMER_SLACK >= self.damage_due and not self.shaking:
             self.shaking = True
-            self.shake_start_time = pygame.time.get_ticks()
+            self.shake_start_time = game_clock.get_ticks()
             self.color = ENEMY_DEFAULT_COLOR
             self.red_duration = 2000
 
         if self.shaking and not self.is_shooter:
-            elapsed = pygame.time.get_ticks() - self.shake_start_time
+            elapsed = game_clock.get_ticks() - self.shake_start_time
             if elapsed < 1000:
                 self.x += random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
                 self.y += random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
@@ -720,15 +1406,34 @@ class Enemy:
                 self.shaking = False
                 self.color = ENEMY_DEFAULT_COLOR
                 self.damage_timer = random.randint(1000, 3000) + random.randint(0, 5000)
-                
+                self.damage_due = game_clock.get_ticks() + self.damage_timer
+
+    def next_wake(self, current_time):
+        # Когда update() и shoot() снова что-то изменят; current_time — чтобы проснуться на следующем шаге
+        if self.is_shooter:
+            if self.shaking:
+                if current_time - self.shake_start_time < 500:
+                    return current_time  # Тряска перед выстрелом идёт каждый шаг
+                return self.last_shot_time + self.shoot_cooldown
+            if self.damage_due <= current_time + TIMER_SLACK:
+                return current_time
+            return min(self.damage_due, self.last_shot_time + self.shoot_cooldown)
+        if not self.shaking:
+            return self.damage_due
+        if self.color != ENEMY_COLOR:
+            return current_time  # Тряска до покраснения идёт каждый шаг
+        return self.shake_start_time + 2000
+
 class SuicideEnemy(Enemy):
+    __slots__ = ('explode', 'wave')
+    symbol = 'o'
+    shake_duration = 1500  # Длительность тряски перед взрывом
+
     def __init__(self, x, y, wave=1):
         super().__init__(x, y, is_shooter=False, wave=wave)
-        self.symbol = 'o'
         self.hp = 3 * (1 + 0.05 * (wave - 1))  # Базовое HP увеличивается с волнами
         self.shaking = False
         self.shake_start_time = None
-        self.shake_duration = 1500  # Длительность тряски перед взрывом
         self.explode = False  # Флаг для взрыва
         self.wave = wave
 
@@ -741,11 +1446,12 @@ class SuicideEnemy(Enemy):
         else:
             if not self.shaking:
                 self.shaking = True
-                self.shake_start_time = pygame.time.get_ticks()
+                self.shake_start_time = game_clock.get_ticks()
+                timers.schedule(self, self.shake_start_time)
 
     def update(self, delta_time):
         if self.shaking:
-            elapsed_time = pygame.time.get_ticks() - self.shake_start_time
+            elapsed_time = game_clock.get_ticks() - self.shake_start_time
             if elapsed_time < self.shake_duration:
                 if not self.is_dead:
                     # Тряска врага
@@ -758,27 +1464,52 @@ class SuicideEnemy(Enemy):
         else:
             # Обычное поведение движения к игроку
             pass
-        
+
+    def next_wake(self, current_time):
+        # Без тряски смертнику нечего делать — его будит take_damage()
+        return current_time if self.shaking and not self.is_dead else None
+
+# Отдых рашера раньше проверялся на каждом шаге заново брошенным randint(1000, 2500) и кончался на первом шаге,
+# где прошедшее время не меньше броска. Таблица хранит это же распределение для шага SIMULATION_STEP_MS,
+# чтобы длительность выбиралась одним броском в начале отдыха, а не опросом на каждом шаге
+def build_rest_table(step_ms, low, high):
+    cumulative = []  # Вероятность, что отдых закончился не позже соответствующего шага
+    durations = []
+    survive = 1.0
+    elapsed = 0
+    while survive > 0:
+        elapsed += step_ms
+        end_chance = min(max((math.floor(elapsed) - low + 1) / (high - low + 1), 0), 1)
+        survive *= 1 - end_chance
+        cumulative.append(1 - survive)
+        durations.append(elapsed)
+    return cumulative, durations
+
+RUSHER_REST_CUMULATIVE, RUSHER_REST_DURATIONS = build_rest_table(SIMULATION_STEP_MS, 1000, 2500)
+
 class RusherEnemy(Enemy):
+    __slots__ = ('velocity_x', 'velocity_y', 'rushing', 'resting', 'rush_start_time', 'rest_start_time', 'rest_duration')
+    symbol = 'R'
+    rush_speed = 7  # Скорость рывка
+    rush_inertia = 0.97  # Инерция для замедления рывка
+    shake_duration = 900  # Тряска перед рывком
+
     def __init__(self, x, y, wave=6):
         super().__init__(x, y, is_shooter=False, wave=wave)
-        self.symbol = 'R'
-        self.rush_speed = 7  # Скорость рывка
-        self.rush_inertia = 0.97  # Инерция для замедления рывка
         self.velocity_x = 0  # Начальная скорость по оси X
         self.velocity_y = 0  # Начальная скорость по оси Y
         self.rushing = False
         self.resting = False
         self.rush_start_time = None
         self.rest_start_time = None
-        self.shake_duration = 900  # Тряска перед рывком
+        self.rest_duration = None  # Длительность текущего отдыха, выбирается в начале отдыха
 
     def update(self, player_x, player_y, delta_time):
-        current_time = pygame.time.get_ticks()
+        current_time = game_clock.get_ticks()
 
         # Если враг отдыхает после рывка
         if self.resting:
-            if current_time - self.rest_start_time >= random.randint(1000, 2500):
+            if current_time - self.rest_start_time >= self.rest_duration:
                 self.resting = False  # Завершение отдыха
                 self.color = ENEMY_DEFAULT_COLOR  # Сброс цвета врага на стандартный после отдыха
             return
@@ -795,6 +1526,7 @@ class RusherEnemy(Enemy):
                 self.rushing = False
                 self.resting = True
                 self.rest_start_time = current_time
+                self.rest_duration = RUSHER_REST_DURATIONS[bisect.bisect_right(RUSHER_REST_CUMULATIVE, random.random())]
                 self.color = ENEMY_DEFAULT_COLOR  # Сброс цвета на стандартный после рывка
             return
 
@@ -820,12 +1552,42 @@ class RusherEnemy(Enemy):
             else:
                 self.x += random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
                 self.y += random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
-        
+
+    def next_wake(self, current_time):
+        # Тряска и рывок идут каждый шаг, отдых — до конца отдыха
+        if self.resting:
+            return self.rest_start_time + self.rest_duration
+        return current_time
+
 # Класс босса
+# Фазы босса — общая таблица для всех появлений
+BOSS_PHASES = (
+    {'threshold': 0.7, 'patterns': ('explode_shot', 'burst_shot', 'melee_attack')},  # Фаза 0: hp_ratio >0.7
+    {'threshold': 0.5, 'patterns': ('explode_shot', 'laser_beam', 'rush')},  # Фаза 1: 0.4 < hp_ratio <=0.7
+    {'threshold': 0.2, 'patterns': ('laser_beam', 'rush')},  # Фаза 2: 0.1 < hp_ratio <=0.4
+    {'threshold': 0.0, 'patterns': ('laser_beam', 'summon_suicide_enemies')}  # Фаза 3: hp_ratio <=0.1
+)
+
 class Boss(Enemy):
+    __slots__ = ('max_hp', 'projectile_damage', 'current_attack_index', 'last_attack_time', 'is_red', 'red_start_time',
+                 'attack_in_progress', 'next_attack', 'phases', 'current_phase', 'wave', 'rushing', 'resting', 'velocity_x',
+                 'velocity_y', 'rush_start_time', 'rest_start_time', 'whip_active', 'whip_start_time', 'last_whip_emit_time',
+                 'whip_step', 'whip_duration')
+    is_boss = True
+    timer_driven = False  # Босс движется внутри update(), поэтому обновляется каждый шаг
+    symbol = 'B'
+    attack_patterns = ('explode_shot', 'burst_shot', 'melee_attack')
+    attack_cooldown = 1500  # Время между атаками в мс
+    shake_duration = 900  # Длительность тряски перед атакой
+    rush_speed = 10  # Скорость рывка
+    rush_inertia = 0.97  # Инерция для замедления рывка
+    rush_duration = 900  # Длительность рывка в мс
+    rush_rest_min = 1000  # Минимальное время отдыха после рывка
+    rush_rest_max = 2500  # Максимальное время отдыха после рывка
+    whip_emit_interval = 40  # Интервал выпуска проектиля (мс)
+
     def __init__(self, x, y, appearance_number=1, wave=5):
         super().__init__(x, y, is_shooter=False, wave=wave)
-        self.symbol = 'B'
         # Стартовые характеристики
         base_hp = 69
         base_contact_damage = 3
@@ -839,46 +1601,31 @@ class Boss(Enemy):
         self.color = ENEMY_DEFAULT_COLOR
 
         # Состояния атаки босса
-        self.attack_patterns = ['explode_shot', 'burst_shot', 'melee_attack']
         self.current_attack_index = 0
-        self.attack_cooldown = 1500  # Время между атаками в мс
-        self.last_attack_time = pygame.time.get_ticks()
+        self.last_attack_time = game_clock.get_ticks()
         self.shaking = False
         self.shake_start_time = 0
-        self.shake_duration = 900  # Длительность тряски перед атакой
         self.is_red = False  # Флаг для состояния атаки в ближнем бою
         self.red_start_time = 0
         self.attack_in_progress = False
         self.next_attack = None
 
-        # Фазы босса
-        self.phases = [
-            {'threshold': 0.7, 'patterns': ['explode_shot', 'burst_shot', 'melee_attack']},  # Фаза 0: hp_ratio >0.7
-            {'threshold': 0.5, 'patterns': ['explode_shot', 'laser_beam', 'rush']},  # Фаза 1: 0.4 < hp_ratio <=0.7
-            {'threshold': 0.2, 'patterns': ['laser_beam', 'rush']},  # Фаза 2: 0.1 < hp_ratio <=0.4
-            {'threshold': 0.0, 'patterns': ['laser_beam', 'summon_suicide_enemies']}  # Фаза 3: hp_ratio <=0.1
-        ]
+        # Фазы босса (ссылка на общую таблицу; бенчмарки подменяют её своей)
+        self.phases = BOSS_PHASES
         self.current_phase = 0
         self.wave = wave
         # Параметры для рывка
         self.rushing = False
         self.resting = False
-        self.rush_speed = 10  # Скорость рывка
-        self.rush_inertia = 0.97  # Инерция для замедления рывка
         self.velocity_x = 0
         self.velocity_y = 0
         self.rush_start_time = None
         self.rest_start_time = None
-        self.rush_duration = 900  # Длительность рывка в мс
-        self.rush_rest_min = 1000  # Минимальное время отдыха после рывка
-        self.rush_rest_max = 2500  # Максимальное время отдыха после рывка
         # Атрибуты для атаки кнута
         self.whip_active = False            # Флаг активности атаки кнута
         self.whip_start_time = 0            # Время начала атаки кнута
-        self.whip_emit_interval = 40        # Интервал выпуска проектиля (мс)
         self.last_whip_emit_time = 0         # Время последнего выпуска проектиля
-        self.whip_angle = 0                  # Текущий угол выпуска (рад)
-        self.whip_rotation_speed = math.pi / 2  # Скорость вращения (рад/сек)
+        self.whip_step = 0                   # Текущее направление выпуска — индекс в таблице узора laser_beam
         self.whip_duration = random.randint(1500, 3000)            # Длительность атаки кнута (мс)
 
     def update_phase(self):
@@ -895,7 +1642,7 @@ class Boss(Enemy):
             self.current_phase = new_phase
 
     def update(self, delta_time, player_x, player_y, projectiles, enemies):
-        current_time = pygame.time.get_ticks()
+        current_time = game_clock.get_ticks()
 
         # Обновляем фазу босса
         self.update_phase()
@@ -906,8 +1653,7 @@ class Boss(Enemy):
                 self.laser_beam(projectiles)
                 self.last_whip_emit_time = current_time
 
-            self.whip_angle += self.whip_rotation_speed * (self.whip_emit_interval / 1000.0)  # rad/sec * sec = rad
-            self.whip_angle %= (2 * math.pi)  # Ограничиваем угол до [0, 2π)
+            self.whip_step = (self.whip_step + 1) % BULLET_PATTERNS['laser_beam']['steps']
 
             # Проверяем окончание атаки кнута
             if current_time - self.whip_start_time >= self.whip_duration:
@@ -977,7 +1723,7 @@ class Boss(Enemy):
     def perform_attack(self):
         # Начинаем тряску перед атакой
         self.shaking = True
-        self.shake_start_time = pygame.time.get_ticks()
+        self.shake_start_time = game_clock.get_ticks()
         
         # Выбираем атаки в зависимости от текущей фазы
         current_phase_patterns = self.phases[self.current_phase]['patterns']
@@ -991,17 +1737,20 @@ class Boss(Enemy):
             self.burst_shot(player_x, player_y, projectiles)
         elif self.next_attack == 'melee_attack':
             self.is_red = True  # Босс становится красным для ближней атаки
-            self.red_start_time = pygame.time.get_ticks()
+            self.red_start_time = game_clock.get_ticks()
         elif self.next_attack == 'laser_beam':
             # Инициализация атаки кнута после тряски
             self.whip_active = True
-            self.whip_start_time = pygame.time.get_ticks()
+            self.whip_start_time = game_clock.get_ticks()
             self.last_whip_emit_time = self.whip_start_time
-            self.whip_angle = 0  # Начальный угол
+            self.whip_step = 0  # Начальный угол
         elif self.next_attack == 'summon_suicide_enemies':
             self.summon_suicide_enemies(enemies)
         elif self.next_attack == 'rush':
             self.perform_rush(player_x, player_y)
+        elif self.next_attack in BULLET_PATTERNS:
+            # Атаки, которые целиком описаны узором пуль
+            emit_pattern(projectiles, self.next_attack, self.x, self.y, self.projectile_damage, target=(player_x, player_y))
         # Сбрасываем тип следующей атаки
         self.next_attack = None
         
@@ -1014,45 +1763,20 @@ class Boss(Enemy):
             self.velocity_x = (dx / distance) * self.rush_speed
             self.velocity_y = (dy / distance) * self.rush_speed
             self.rushing = True
-            self.rush_start_time = pygame.time.get_ticks()
+            self.rush_start_time = game_clock.get_ticks()
             self.color = (255, 0, 0)
 
     def explode_shot(self, projectiles):
         # Босс выпускает снаряды во все стороны
-        num_projectiles = 15
-        angle_between_projectiles = 360 / num_projectiles
-        for i in range(num_projectiles):
-            angle = math.radians(i * angle_between_projectiles)
-            dx = math.cos(angle)
-            dy = math.sin(angle)
-            projectile = Projectile(self.x, self.y, dx, dy, self.projectile_damage)
-            projectiles.append(projectile)
+        emit_pattern(projectiles, 'explode_shot', self.x, self.y, self.projectile_damage)
 
     def burst_shot(self, player_x, player_y, projectiles):
         # Босс стреляет очередью из 5-10 снарядов в игрока
-        num_shots = random.randint(5, 10)
-        for _ in range(num_shots):
-            dx = player_x - self.x + random.uniform(-25, 25)  # Немного разброса
-            dy = player_y - self.y + random.uniform(-25, 25)
-            distance = math.sqrt(dx ** 2 + dy ** 2)
-            if distance > 0:
-                projectile = Projectile(self.x, self.y, dx / distance, dy / distance, self.projectile_damage)
-                projectiles.append(projectile)
+        emit_pattern(projectiles, 'burst_shot', self.x, self.y, self.projectile_damage, target=(player_x, player_y))
 
     def laser_beam(self, projectiles):
-        # Расчёт направления на основе текущего угла
-        dx = math.cos(self.whip_angle)
-        dy = math.sin(self.whip_angle)
-        
-        projectile = Projectile(
-            x=self.x,
-            y=self.y,
-            dx=dx,
-            dy=dy,
-            damage=self.projectile_damage,
-            follow_player=False
-        )
-        projectiles.append(projectile)
+        # Выпуск по текущему направлению кнута
+        emit_pattern(projectiles, 'laser_beam', self.x, self.y, self.projectile_damage, step=self.whip_step)
 
     def summon_suicide_enemies(self, enemies):
         num_suicide_enemies = random.randint(3, 5)
@@ -1067,46 +1791,297 @@ class Boss(Enemy):
         if self.hp <= 0:
             self.is_dead = True
 
-# Класс для отображения чисел урона и других чисел
-class DamageNumber:
-    def __init__(self, player_x, player_y, damage, color, lifetime=1000):
+# Векторизованный движок роя для обычных врагов и стрелков
+# Состояние хранится в массивах NumPy (по массиву на поле), а объекты SwarmEnemy — лишь тонкие представления
+SWARM_FIELDS = {
+    'x': np.float64,
+    'y': np.float64,
+    'hp': np.float64,
+    'damage': np.float64,
+    'damage_timer': np.float64,
+    'red_duration': np.float64,
+    'last_hit_time': np.float64,
+    'shake_start_time': np.float64,
+    'shoot_cooldown': np.float64,
+    'last_shot_time': np.float64,
+    'preferred_distance': np.float64,
+    'shaking': np.bool_,
+    'red': np.bool_,  # Враг красный (color == ENEMY_COLOR)
+    'is_shooter': np.bool_,
+    'is_dead': np.bool_,
+    'active': np.bool_  # Слот занят живым представлением
+}
+
+class SwarmEngine:
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        for name, dtype in SWARM_FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.views = [None] * capacity
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def grow(self):
+        # Удваиваем ёмкость всех массивов
+        old_capacity = self.capacity
+        self.capacity *= 2
+        for name, dtype in SWARM_FIELDS.items():
+            array = np.zeros(self.capacity, dtype=dtype)
+            array[:old_capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.views.extend([None] * old_capacity)
+        self.free_slots.extend(range(self.capacity - 1, old_capacity - 1, -1))
+
+    def allocate(self, view):
+        if not self.free_slots:
+            self.grow()
+        slot = self.free_slots.pop()
+        for name in SWARM_FIELDS:
+            getattr(self, name)[slot] = 0
+        self.active[slot] = True
+        self.views[slot] = view
+        return slot
+
+    def release_dead(self):
+        # Освобождаем слоты погибших врагов (представления к этому моменту уже убраны из списка)
+        dead = np.flatnonzero(self.active & self.is_dead)
+        self.active[dead] = False
+        for slot in dead:
+            self.views[slot] = None
+            self.free_slots.append(slot)
+
+    def step(self, player_x, player_y, delta_time, obstacles=()):
+        # Один пакетный шаг: преследование/удержание дистанции, разведение, ограничение экраном, тряска
+        # Возвращает список стрелков, которые стреляют в этом кадре
+        self.release_dead()
+        idx = np.flatnonzero(self.active)
+        if not len(idx):
+            return []
+        current_time = game_clock.get_ticks()
+        x = self.x[idx]
+        y = self.y[idx]
+        is_shooter = self.is_shooter[idx]
+
+        # Движение к игроку со случайным разбросом скорости, как в move_towards_player:
+        # при разведении он меняет соотношение между тягой к игроку и отталкиванием
+        dx = player_x - x
+        dy = player_y - y
+        distance = np.hypot(dx, dy)
+        safe_distance = np.where(distance > 0, distance, 1)
+        dir_x = dx / safe_distance
+        dir_y = dy / safe_distance
+        preferred = self.preferred_distance[idx]
+        chase = ~is_shooter | (distance > preferred)
+        retreat = is_shooter & (distance < preferred - 20)
+        speed = np.where(is_shooter, np.random.randint(10, 14, len(idx)), np.random.randint(10, 16, len(idx))) / 10
+        factor = np.where(chase, speed, np.where(retreat, -1.0, 0.0)) * (distance > 0)
+        move_x = dir_x * factor
+        move_y = dir_y * factor
+
+        # Разведение: отталкивание от всех врагов ближе FONT_SIZE (включая не входящих в рой)
+        all_x = np.concatenate((x, np.fromiter((o.x for o in obstacles), np.float64)))
+        all_y = np.concatenate((y, np.fromiter((o.y for o in obstacles), np.float64)))
+        for start in range(0, len(idx), 256):
+            rows = slice(start, start + 256)
+            delta_x = x[rows, None] - all_x[None, :]
+            delta_y = y[rows, None] - all_y[None, :]
+            pair_distance = np.hypot(delta_x, delta_y)
+            near = (pair_distance < FONT_SIZE) & (pair_distance > 0)
+            inverse = np.divide(1.0, pair_distance, out=np.zeros_like(pair_distance), where=near)
+            move_x[rows] += (delta_x * inverse).sum(axis=1)
+            move_y[rows] += (delta_y * inverse).sum(axis=1)
+
+        # Нормализуем вектор движения и ограничиваем позицию границами экрана
+        total_movement = np.hypot(move_x, move_y)
+        np.divide(move_x, total_movement, out=move_x, where=total_movement > 0)
+        np.divide(move_y, total_movement, out=move_y, where=total_movement > 0)
+        x = np.clip(x + move_x, 0, SCREEN_WIDTH - FONT_SIZE)
+        y = np.clip(y + move_y, 0, SCREEN_HEIGHT - FONT_SIZE)
+
+        # Таймеры и тряска (логика Enemy.update)
+        damage_timer = self.damage_timer[idx] - delta_time
+        shaking = self.shaking[idx]
+        shake_start_time = self.shake_start_time[idx]
+        red = self.red[idx]
+        elapsed = current_time - shake_start_time
+        jitter = shaking & is_shooter & (elapsed < 500)
+
+        start_shake = (damage_timer <= 0) & ~shaking
+        shaking = shaking | start_shake
+        shake_start_time = np.where(start_shake, current_time, shake_start_time)
+        red &= ~start_shake
+        self.red_duration[idx[start_shake]] = 2000
+
+        elapsed = current_time - shake_start_time
+        plain_shaking = shaking & ~is_shooter
+        jitter |= plain_shaking & (elapsed < 1000)
+        turn_red = plain_shaking & (elapsed >= 1000) & ~red
+        calm_down = plain_shaking & (elapsed >= 2000) & red
+        red = (red | turn_red) & ~calm_down
+        shaking &= ~calm_down
+        calm_count = int(calm_down.sum())
+        if calm_count:
+            damage_timer[calm_down] = np.random.randint(1000, 3001, calm_count) + np.random.randint(0, 5001, calm_count)
+
+        jitter_count = int(jitter.sum())
+        if jitter_count:
+            x[jitter] += np.random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY + 1, jitter_count)
+            y[jitter] += np.random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY + 1, jitter_count)
+
+        # Стрельба (логика Enemy.shoot): тряска 500 мс после кулдауна, затем выстрел
+        ready = is_shooter & (current_time - self.last_shot_time[idx] > self.shoot_cooldown[idx])
+        begin_aim = ready & ~shaking
+        fire = ready & shaking & (current_time - shake_start_time >= 500)
+        shaking = (shaking | begin_aim) & ~fire
+        shake_start_time = np.where(begin_aim, current_time, shake_start_time)
+        self.last_shot_time[idx[fire]] = current_time
+
+        self.x[idx] = x
+        self.y[idx] = y
+        self.damage_timer[idx] = damage_timer
+        self.shaking[idx] = shaking
+        self.shake_start_time[idx] = shake_start_time
+        self.red[idx] = red
+        return [self.views[slot] for slot in idx[fire]]
+
+def swarm_field(name):
+    # Свойство, читающее и пишущее поле врага прямо в массив роя
+    def getter(self):
+        value = getattr(self.swarm, name)[self.slot]
+        if SWARM_FIELDS[name] is np.bool_:
+            return bool(value)
+        value = float(value)
+        return None if math.isnan(value) else value
+
+    def setter(self, value):
+        getattr(self.swarm, name)[self.slot] = np.nan if value is None else value
+
+    return property(getter, setter)
+
+class SwarmEnemy(Enemy):
+    __slots__ = ('swarm', 'slot')
+    timer_driven = False  # Таймеры роя считает SwarmEngine
+    x = swarm_field('x')
+    y = swarm_field('y')
+    hp = swarm_field('hp')
+    damage = swarm_field('damage')
+    damage_timer = swarm_field('damage_timer')
+    red_duration = swarm_field('red_duration')
+    last_hit_time = swarm_field('last_hit_time')
+    shake_start_time = swarm_field('shake_start_time')
+    shoot_cooldown = swarm_field('shoot_cooldown')
+    last_shot_time = swarm_field('last_shot_time')
+    preferred_distance = swarm_field('preferred_distance')
+    shaking = swarm_field('shaking')
+    is_shooter = swarm_field('is_shooter')
+    is_dead = swarm_field('is_dead')
+
+    def __init__(self, swarm, x, y, is_shooter=False, wave=1):
+        self.swarm = swarm
+        self.slot = swarm.allocate(self)
+        super().__init__(x, y, is_shooter, wave)
+
+    @property
+    def color(self):
+        return ENEMY_COLOR if self.swarm.red[self.slot] else ENEMY_DEFAULT_COLOR
+
+    @color.setter
+    def color(self, value):
+        self.swarm.red[self.slot] = value == ENEMY_COLOR
+
+# Пул чисел урона и других чисел фиксированной ёмкости
+# Каждый текст растеризуется один раз на каждый размер шрифта 10–20, анимация считается одним проходом
+DAMAGE_NUMBER_MIN_SIZE = 10  # Начальный размер шрифта
+DAMAGE_NUMBER_MAX_SIZE = 20  # Максимальный размер шрифта
+damage_number_fonts = {}
+damage_text_cache = {}
+
+def get_damage_text(text, color, size):
+    key = (text, color, size)
+    surface = damage_text_cache.get(key)
+    if surface is None:
+        if len(damage_text_cache) > 4096:
+            damage_text_cache.clear()  # Не даём кэшу расти бесконечно за длинный забег
+        number_font = damage_number_fonts.get(size)
+        if number_font is None:
+            number_font = pygame.font.SysFont('Courier', size)
+            damage_number_fonts[size] = number_font
+        surface = number_font.render(text, True, color)
+        damage_text_cache[key] = surface
+    return surface
+
+class DamageNumberPool:
+    def __init__(self, capacity=128, budget=None):
+        self.capacity = capacity
+        self.count = 0
+        self.budget = budget  # EntityBudget забега; None — ограничено только ёмкостью
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.start_time = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity)
+        self.font_size = np.full(capacity, DAMAGE_NUMBER_MIN_SIZE)
+        self.texts = [None] * capacity
+        self.colors = [None] * capacity
+
+    def __len__(self):
+        return self.count
+
+    def keep(self, mask):
+        # Оставляем только числа, отмеченные маской (порядок сохраняется)
+        n = self.count
+        kept = int(mask.sum())
+        if kept == n:
+            return
+        for array in (self.x, self.y, self.start_time, self.lifetime, self.font_size):
+            array[:kept] = array[:n][mask]
+        indices = np.flatnonzero(mask).tolist()
+        self.texts[:kept] = [self.texts[i] for i in indices]
+        self.colors[:kept] = [self.colors[i] for i in indices]
+        self.count = kept
+
+    def spawn(self, player_x, player_y, damage, color, lifetime=1000):
+        if self.count == self.capacity:
+            # Пул заполнен — вытесняем самое старое число
+            mask = np.ones(self.count, dtype=bool)
+            mask[0] = False
+            self.keep(mask)
         # Рандомное положение вокруг игрока на небольшом расстоянии
         angle = random.uniform(0, 2 * math.pi)
         distance = random.uniform(20, 40)  # Расстояние от персонажа
-        self.x = player_x + math.cos(angle) * distance
-        self.y = player_y + math.sin(angle) * distance
-
-        self.damage = damage
-        self.color = color
-        self.lifetime = lifetime  # Длительность отображения числа
-        self.start_time = pygame.time.get_ticks()
-
-        self.initial_font_size = 10  # Начальный размер шрифта
-        self.max_font_size = 20      # Максимальный размер шрифта
-        self.font_size = self.initial_font_size
+        if self.budget is not None and self.count >= self.budget.limits['damage_numbers']:
+            self.budget.merge_damage_number(self, damage, color)
+            return
+        i = self.count
+        self.x[i] = player_x + math.cos(angle) * distance
+        self.y[i] = player_y + math.sin(angle) * distance
+        self.start_time[i] = game_clock.get_ticks()
+        self.lifetime[i] = lifetime  # Длительность отображения числа
+        self.font_size[i] = DAMAGE_NUMBER_MIN_SIZE
+        self.texts[i] = str(damage)
+        self.colors[i] = color
+        self.count += 1
 
     def update(self):
-        elapsed_time = pygame.time.get_ticks() - self.start_time
-        life_ratio = elapsed_time / self.lifetime
-        if life_ratio > 1:
-            return False  # Удаляем число после завершения времени жизни
-
-        # Анимация изменения размера числа
-        if life_ratio <= 0.5:
-            # Увеличиваем размер в первой половине времени жизни
-            self.font_size = self.initial_font_size + (self.max_font_size - self.initial_font_size) * (life_ratio * 2)
-        else:
-            # Уменьшаем размер во второй половине времени жизни
-            self.font_size = self.max_font_size - (self.max_font_size - self.initial_font_size) * ((life_ratio - 0.5) * 2)
-
-        return True
-
-    def draw(self, surface):
-        temp_font = pygame.font.SysFont('Courier', int(self.font_size))
-        text_surface = temp_font.render(str(self.damage), True, self.color)
-        # Центрируем текст по координатам x и y
-        rect = text_surface.get_rect(center=(int(self.x), int(self.y)))
-        surface.blit(text_surface, rect)
+        n = self.count
+        if not n:
+            return
+        life_ratio = (game_clock.get_ticks() - self.start_time[:n]) / self.lifetime[:n]
+        # Удаляем числа после завершения времени жизни
+        alive = life_ratio <= 1
+        if not alive.all():
+            life_ratio = life_ratio[alive]
+            self.keep(alive)
+            n = self.count
+        # Размер растёт в первой половине времени жизни и уменьшается во второй
+        growth = np.where(life_ratio <= 0.5, life_ratio * 2, 1 - (life_ratio - 0.5) * 2)
+        self.font_size[:n] = DAMAGE_NUMBER_MIN_SIZE + (DAMAGE_NUMBER_MAX_SIZE - DAMAGE_NUMBER_MIN_SIZE) * growth
+
+    def draw(self, batch):
+        n = self.count
+        for text, color, size, x, y in zip(self.texts, self.colors, self.font_size[:n].tolist(),
+                                           self.x[:n].astype(int).tolist(), self.y[:n].astype(int).tolist()):
+            text_surface = get_damage_text(text, color, size)
+            # Центрируем текст по координатам x и y
+            batch.append((text_surface, text_surface.get_rect(center=(x, y))))
 
 def spawn_health_pickup(enemy_x, enemy_y):
     base_chance = 0.15  # 15% базовый шанс
@@ -1119,27 +2094,38 @@ def spawn_health_pickup(enemy_x, enemy_y):
     return None
 
 # Функция для создания врагов и аптечек
-def spawn_enemies(count, wave):
-    enemies = []
+# Враги волны по одному в виде (класс, аргументы). Случайные величины тянутся по мере перебора,
+# поэтому если создавать каждого врага сразу, порядок случайных чисел тот же, что и при спавне целиком
+def iter_enemy_spawns(count, wave, swarm=None):
     for _ in range(count):
         x = random.randint(0, SCREEN_WIDTH)
         y = random.randint(0, SCREEN_HEIGHT)
         enemy_type_chance = random.random()
         if wave >= 6 and enemy_type_chance < 0.13:
-            enemies.append(RusherEnemy(x, y, wave))
+            yield RusherEnemy, (x, y, wave)
         elif enemy_type_chance > 0.89:
-            enemies.append(SuicideEnemy(x, y, wave))
+            yield SuicideEnemy, (x, y, wave)
         else:
             is_shooter = random.random() < 0.31
-            enemies.append(Enemy(x, y, is_shooter, wave))
-    return enemies
+            if swarm is not None:
+                yield SwarmEnemy, (swarm, x, y, is_shooter, wave)
+            else:
+                yield Enemy, (x, y, is_shooter, wave)
+
+def spawn_enemies(count, wave, swarm=None):
+    return [enemy_class(*args) for enemy_class, args in iter_enemy_spawns(count, wave, swarm)]
+
+def interpolate_position(entity, alpha):
+    # Позиция между двумя последними шагами симуляции; alpha — доля шага, прошедшая с последнего тика
+    return (entity.prev_x + (entity.x - entity.prev_x) * alpha,
+            entity.prev_y + (entity.y - entity.prev_y) * alpha)
 
-def draw_text(text, font, color, x, y):
-    text_surface = font.render(text, True, color)
-    screen.blit(text_surface, (x, y))
+def queue_glyph(batch, symbol, font, color, x, y):
+    # Глиф из атласа добавляется в общий список для одного вызова Surface.blits за кадр
+    batch.append((get_glyph(symbol, font, color), (x, y)))
 
-def handle_collisions(player, enemies, damage_numbers, wave, wave_start_time, projectiles, health_pickups):
-    current_time = pygame.time.get_ticks()
+def handle_collisions(player, enemies, damage_numbers, wave, wave_start_time, projectiles, health_pickups, enemy_grid=None):
+    current_time = game_clock.get_ticks()
 
     # Задержка урона в течение первой секунды волны
     if current_time - wave_start_time < INVULNERABILITY_DURATION:
@@ -1147,29 +2133,31 @@ def handle_collisions(player, enemies, damage_numbers, wave, wave_start_time, pr
 
     game_over = False
 
-    for enemy in enemies:
+    # Широкая фаза: с игроком могут столкнуться только враги из соседних ячеек сетки
+    candidates = enemies if enemy_grid is None else enemy_grid.nearby(player.x, player.y)
+    for enemy in candidates:
         # Проверка столкновения между игроком и врагом
-        if math.sqrt((player.x - enemy.x) ** 2 + (player.y - enemy.y) ** 2) < FONT_SIZE:
+        if (player.x - enemy.x) ** 2 + (player.y - enemy.y) ** 2 < COLLISION_DISTANCE_SQUARED:
             # Если враг красный или босс в состоянии атаки
-            if (enemy.color == ENEMY_COLOR or (isinstance(enemy, Boss) and enemy.is_red)) and current_time - enemy.last_hit_time > DAMAGE_COOLDOWN:
+            if (enemy.color == ENEMY_COLOR or (enemy.is_boss and enemy.is_red)) and current_time - enemy.last_hit_time > DAMAGE_COOLDOWN:
                 enemy.last_hit_time = current_time
                 damage = enemy.damage
                 player_died = player.apply_damage(damage)
-                damage_numbers.append(DamageNumber(player.x, player.y, round(player.last_damage_taken, 1), (255, 0, 0)))
+                damage_numbers.spawn(player.x, player.y, round(player.last_damage_taken, 1), (255, 0, 0))
                 if player_died:
                     return True  # Сигнализирует о завершении игры
 
             # Игрок наносит урон врагу с кулдауном
             if current_time - player.last_hit_time > DAMAGE_COOLDOWN:
                 player.last_hit_time = current_time
-                pygame.mixer.Sound.play(random.choice(hit_sounds))
+                random.choice(hit_sounds).play()
                 enemy.take_damage(player.damage)
                 enemy.knockback(player.x, player.y)
-                damage_numbers.append(DamageNumber(enemy.x, enemy.y - 20, player.damage, TEXT_COLOR))
+                damage_numbers.spawn(enemy.x, enemy.y - 20, player.damage, TEXT_COLOR)
 
                 # Получение опыта за убийство врага
                 if enemy.is_dead:
-                    if isinstance(enemy, Boss):
+                    if enemy.is_boss:
                         exp_gain = round(10 + 5 * wave, 1)  # Босс дает больше опыта
                     elif isinstance(enemy, RusherEnemy):
                         exp_gain = round(1.5 + 0.1 * wave, 1)
@@ -1182,33 +2170,95 @@ def handle_collisions(player, enemies, damage_numbers, wave, wave_start_time, pr
                         exp_gain /= 2  # Опыт в 2 раза меньше
                     
                     player.gain_exp(exp_gain)
-                    damage_numbers.append(DamageNumber(player.x, player.y, f"+{exp_gain} {get_text('exp')}", (0, 0, 255)))
+                    damage_numbers.spawn(player.x, player.y, f"+{exp_gain} {get_text('exp')}", (0, 0, 255))
 
                     health_pickup = spawn_health_pickup(enemy.x, enemy.y)
                     if health_pickup:
                         health_pickups.append(health_pickup)
 
     # Обработка столкновений с снарядами
-    for projectile in projectiles[:]:
-        if projectile.is_colliding(player):
-            projectiles.remove(projectile)
-            damage = projectile.damage
-            player_died = player.apply_damage(damage)
-            damage_numbers.append(DamageNumber(player.x, player.y + 30, round(player.last_damage_taken, 1), (255, 0, 0)))
-            if player_died:
-                return True
+    for damage in projectiles.pop_hits(player):
+        player_died = player.apply_damage(damage)
+        damage_numbers.spawn(player.x, player.y + 30, round(player.last_damage_taken, 1), (255, 0, 0))
+        if player_died:
+            return True
 
     return game_over
 
+# Кадр статичного меню: текст рисуется в кэш один раз и перерисовывается только после нажатия клавиши,
+# смены языка или разрешения. Между нажатиями цикл спит в pygame.event.wait и просыпается
+# раз в MENU_TICK_MS только ради глитча; экран обновляется, лишь когда глитч появился или исчез
+class MenuScreen:
+    def __init__(self, draw):
+        self.draw = draw  # Функция, рисующая содержимое меню на переданной поверхности
+        self.content = None  # Содержимое меню без эффектов
+        self.frame = None  # То же содержимое с полосами — показывается, пока глитча нет
+        self.glitch_rect = None  # Область с текстом: за её пределами фон, и сдвиг каналов ничего не меняет
+        self.language = None
+        self.glitched = False
+        self.needs_present = True
+
+    def invalidate(self):
+        self.content = None
+
+    def refresh(self):
+        size = screen.get_size()
+        if self.content is None or self.content.get_size() != size or self.language != settings['language']:
+            self.content = pygame.Surface(size)
+            self.content.fill(BACKGROUND_COLOR)
+            self.draw(self.content)
+            self.frame = self.content.copy()
+            apply_scanlines(self.frame)
+            self.content.set_colorkey(BACKGROUND_COLOR)
+            self.glitch_rect = self.content.get_bounding_rect().inflate(2, 2).clip(self.content.get_rect())
+            self.content.set_colorkey(None)
+            self.language = settings['language']
+            self.needs_present = True
+
+    def present(self):
+        # Возвращает True, если кадр был выведен на экран
+        shifts = roll_chromatic_shifts()
+        if shifts is not None:
+            # Глитч накладывается на кэшированный кадр, полосы — поверх, как в apply_vhs_effects
+            screen.blit(self.frame, (0, 0))
+            screen.blit(self.content, self.glitch_rect, self.glitch_rect)
+            shift_color_channels(screen.subsurface(self.glitch_rect), shifts)
+            screen.blit(get_scanline_surface(screen.get_size()), self.glitch_rect, self.glitch_rect)
+        elif self.glitched or self.needs_present:
+            screen.blit(self.frame, (0, 0))
+        else:
+            return False
+        self.glitched = shifts is not None
+        self.needs_present = False
+        present_display()
+        return True
+
+    def show(self):
+        self.refresh()
+        return self.present()
+
+    def wait_events(self):
+        event = pygame.event.wait(MENU_TICK_MS)
+        if event.type == pygame.NOEVENT:
+            return []
+        events = [event] + pygame.event.get()
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                # Любое нажатие может поменять содержимое или вернуть нас из вложенного меню
+                self.invalidate()
+            elif event.type == pygame.WINDOWEXPOSED:
+                self.needs_present = True
+        return events
+
 def upgrade_menu(player):
     selected = None
     upgrade_font = pygame.font.SysFont('Courier', 36)
     hint_font = pygame.font.SysFont('Courier', 28)  # Шрифт для подсказки
-    while selected is None:
-        screen.fill(BACKGROUND_COLOR)
+
+    def draw(surface):
         # Отображение заголовка меню улучшений
         title_text = upgrade_font.render(get_text('upgrade_menu'), True, TEXT_COLOR)
-        screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, SCREEN_HEIGHT // 2 - 150))
+        surface.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, SCREEN_HEIGHT // 2 - 150))
         # Опции улучшений
         options = [
             f"1. {get_text('increase_hp')}",
@@ -1217,64 +2267,66 @@ def upgrade_menu(player):
         ]
         for i, option in enumerate(options):
             option_text = font.render(option, True, TEXT_COLOR)
-            screen.blit(option_text, (SCREEN_WIDTH // 2 - option_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50 + i * 40))
+            surface.blit(option_text, (SCREEN_WIDTH // 2 - option_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50 + i * 40))
         # Подсказка
         hint_text = hint_font.render(get_text('press_to_select'), True, TEXT_COLOR)
-        screen.blit(hint_text, (SCREEN_WIDTH // 2 - hint_text.get_width() // 2, SCREEN_HEIGHT - 100))
-        
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
+        surface.blit(hint_text, (SCREEN_WIDTH // 2 - hint_text.get_width() // 2, SCREEN_HEIGHT - 100))
 
-        # Наложение VHS эффекта на экран
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
-        
-        pygame.display.flip()
+    menu_screen = MenuScreen(draw)
+    while selected is None:
+        menu_screen.show()
 
-        for event in pygame.event.get():
+        for event in menu_screen.wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_1:
-                    if 'glass_cannon' in settings['purchased_upgrades']:
-                        player.max_hp *= 1.07
-                        player.max_hp = round(player.max_hp, 1)
-                        player.hp = player.max_hp
-                        player.hp_upgrade_count += 1
-                    else:
-                        # Увеличиваем максимальное HP на 10%
-                        player.max_hp *= 1.10
-                        player.max_hp = round(player.max_hp, 1)  # Округляем до одного знака после запятой
-                        player.hp = player.max_hp  # Восстанавливаем HP до максимума
-                        player.hp_upgrade_count += 1  # Увеличиваем счетчик улучшений HP
-
-                        # Увеличиваем количество восстанавливаемого HP аптечкой на 20%
-                        player.health_pickup_heal_amount *= 1.20
-                        player.health_pickup_heal_amount = round(player.health_pickup_heal_amount, 1)  # Округляем
-
                     selected = "hp"
-                    pygame.mixer.Sound.play(upgrade_select_sound)
                 elif event.key == pygame.K_2:
-                    if 'glass_cannon' in settings['purchased_upgrades']:
-                        player.damage += 2
-                    else:
-                        player.damage += 1
                     selected = "damage"
-                    pygame.mixer.Sound.play(upgrade_select_sound)
                 elif event.key == pygame.K_3:
-                    player.defense_upgrade_count += 1
-                    player.defense = 0.2 * player.defense_upgrade_count  # Обновляем значение защиты
                     selected = "defense"
-                    pygame.mixer.Sound.play(upgrade_select_sound)
-        clock.tick(60)
 
-def wave_countdown():
+    apply_upgrade(player, selected)
+    return selected
+
+def apply_upgrade(player, selected):
+    if selected == "hp":
+        if 'glass_cannon' in settings['purchased_upgrades']:
+            player.max_hp *= 1.07
+            player.max_hp = round(player.max_hp, 1)
+            player.hp = player.max_hp
+            player.hp_upgrade_count += 1
+        else:
+            # Увеличиваем максимальное HP на 10%
+            player.max_hp *= 1.10
+            player.max_hp = round(player.max_hp, 1)  # Округляем до одного знака после запятой
+            player.hp = player.max_hp  # Восстанавливаем HP до максимума
+            player.hp_upgrade_count += 1  # Увеличиваем счетчик улучшений HP
+
+            # Увеличиваем количество восстанавливаемого HP аптечкой на 20%
+            player.health_pickup_heal_amount *= 1.20
+            player.health_pickup_heal_amount = round(player.health_pickup_heal_amount, 1)  # Округляем
+    elif selected == "damage":
+        if 'glass_cannon' in settings['purchased_upgrades']:
+            player.damage += 2
+        else:
+            player.damage += 1
+    elif selected == "defense":
+        player.defense_upgrade_count += 1
+        player.defense = 0.2 * player.defense_upgrade_count  # Обновляем значение защиты
+    upgrade_select_sound.play()
+
+WAVE_COUNTDOWN_MS = 3000  # Отсчёт перед волной; столько же игрового времени проходит между волнами
+
+# idle_task(deadline) получает остаток каждого кадра (до deadline по time.perf_counter) для фоновой работы
+def wave_countdown(idle_task=None):
     countdown_start_time = pygame.time.get_ticks()
-    countdown_duration = 3000  # 3 секунды
+    countdown_duration = WAVE_COUNTDOWN_MS
     last_second = None
     while True:
+        frame_start = time.perf_counter()
         current_time = pygame.time.get_ticks()
         elapsed_time = current_time - countdown_start_time
         remaining_time = countdown_duration - elapsed_time
@@ -1283,24 +2335,51 @@ def wave_countdown():
         seconds_left = int(remaining_time / 1000) + 1
         if seconds_left != last_second:
             last_second = seconds_left
-            pygame.mixer.Sound.play(countdown_sound)
+            countdown_sound.play()
         screen.fill(BACKGROUND_COLOR)
         countdown_text = font.render(f'{get_text('next_wave_in')} {seconds_left}...', True, TEXT_COLOR)
         screen.blit(countdown_text, (SCREEN_WIDTH // 2 - countdown_text.get_width() // 2, SCREEN_HEIGHT // 2))
         # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
-
-        # Наложение VHS эффекта на экран
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
-        pygame.display.flip()
+        apply_vhs_effects(screen)
+        present_display()
         # Обработка событий для предотвращения зависания
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
-        clock.tick(60)       
+        if idle_task is not None:
+            idle_task(frame_start + COUNTDOWN_IDLE_BUDGET_MS / 1000)
+        clock.tick(60)
+
+def draw_main_menu(surface, menu_font, selected_option):
+    # Отображение названия игры
+    title_text = menu_font.render('Ākēdo', True, TEXT_COLOR)
+    surface.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 150))
+
+    # Опции с учетом текущего языка
+    options = [
+        get_text('start_game'),
+        get_text('shop'),
+        get_text('settings'),
+        get_text('how_to_play'),
+        get_text('exit')
+    ]
+
+    # Отображение опций меню
+    for i, option in enumerate(options):
+        if i == selected_option:
+            option_display = '> ' + option
+        else:
+            option_display = option
+        option_text = font.render(option_display, True, TEXT_COLOR)
+        surface.blit(option_text, (SCREEN_WIDTH // 2 - option_text.get_width() // 2, 240 + i * 50))
+
+def record_first_frame():
+    global first_frame_time
+    first_frame_time = time.perf_counter()
+    startup_timings.append(('first frame', (first_frame_time - bootstrap_finished_time) * 1000))
+    if report_startup:
+        print_startup_report()
 
 def main_menu():
     menu_running = True
@@ -1316,8 +2395,13 @@ def main_menu():
         get_text('exit')
     ]
 
+    menu_screen = MenuScreen(lambda surface: draw_main_menu(surface, menu_font, selected_option))
     while menu_running:
-        for event in pygame.event.get():
+        menu_screen.show()
+        if first_frame_time is None:
+            record_first_frame()
+
+        for event in menu_screen.wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1343,90 +2427,47 @@ def main_menu():
                         # Exit
                         pygame.quit()
                         sys.exit()
-
-        # Очистка экрана
-        screen.fill(BACKGROUND_COLOR)
-
-        # Отображение названия игры
-        title_text = menu_font.render('Ākēdo', True, TEXT_COLOR)
-        screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 150))
-        
-        # Обновляем опции с учетом текущего языка
-        options = [
-            get_text('start_game'),
-            get_text('shop'),
-            get_text('settings'),
-            get_text('how_to_play'),
-            get_text('exit')
-        ]
-
-        # Отображение опций меню
-        for i, option in enumerate(options):
-            if i == selected_option:
-                option_display = '> ' + option
-            else:
-                option_display = option
-            option_text = font.render(option_display, True, TEXT_COLOR)
-            screen.blit(option_text, (SCREEN_WIDTH // 2 - option_text.get_width() // 2, 240 + i * 50))
-        
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
-
-        # Наложение VHS эффекта на экран
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
-
-        pygame.display.flip()
-        clock.tick(60)
         
 def how_to_play_menu():
     how_to_play_running = True
     back_option = 'Press ESC to return to the main menu.'
-    
-    instructions = [
-        get_text('how_to_play_title'),
-        "",
-        *localization[settings['language']]['how_to_play_instructions']
-    ]
 
-    while how_to_play_running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    how_to_play_running = False
+    title_font = pygame.font.SysFont('Courier', 36)
+    text_font = pygame.font.SysFont('Courier', 28)
 
-        # Очистка экрана
-        screen.fill(BACKGROUND_COLOR)
+    def draw(surface):
+        instructions = [
+            get_text('how_to_play_title'),
+            "",
+            *localization[settings['language']]['how_to_play_instructions']
+        ]
 
         # Отображение инструкций
         y_offset = SCREEN_HEIGHT // 2 - 250 # Начальная позиция по Y
         for line in instructions:
             if line == "How to Play":
                 # Заголовок
-                line_text = pygame.font.SysFont('Courier', 36).render(line, True, TEXT_COLOR)
+                line_text = title_font.render(line, True, TEXT_COLOR)
             elif line == back_option:
                 # Подсказка для возврата
-                line_text = pygame.font.SysFont('Courier', 28).render(line, True, TEXT_COLOR)
+                line_text = text_font.render(line, True, TEXT_COLOR)
             else:
                 # Основные инструкции
-                line_text = pygame.font.SysFont('Courier', 28).render(line, True, TEXT_COLOR)
-            screen.blit(line_text, (SCREEN_WIDTH // 2 - line_text.get_width() // 2, y_offset))
+                line_text = text_font.render(line, True, TEXT_COLOR)
+            surface.blit(line_text, (SCREEN_WIDTH // 2 - line_text.get_width() // 2, y_offset))
             y_offset += 40  # Отступ между строками
-            
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
 
-        # Наложение VHS эффекта на экран
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
+    menu_screen = MenuScreen(draw)
+    while how_to_play_running:
+        menu_screen.show()
 
-        pygame.display.flip()
-        clock.tick(60)
+        for event in menu_screen.wait_events():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    how_to_play_running = False
         
 def shop_menu():
     shop_running = True
@@ -1441,48 +2482,17 @@ def shop_menu():
     card_height = 100
     card_margin = 20
     max_description_width = card_width - 180  # Оставляем место для названия и кнопки
+    wrapped_descriptions = {}  # Описания переносятся один раз на язык, а не при каждой перерисовке
     
-    while shop_running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    selected_option = (selected_option - 1) % len(shop_upgrades)
-                elif event.key == pygame.K_DOWN:
-                    selected_option = (selected_option + 1) % len(shop_upgrades)
-                elif event.key == pygame.K_RETURN:
-                    upgrade = shop_upgrades[selected_option]
-                    if upgrade['id'] in settings['purchased_upgrades']:
-                        # Продажа улучшения
-                        sell_price = upgrade['price'] / 2
-                        settings['currency'] += sell_price
-                        settings['purchased_upgrades'].remove(upgrade['id'])
-                        pygame.mixer.Sound.play(upgrade_select_sound)
-                        save_settings(settings)
-                    else:
-                        # Покупка улучшения
-                        if settings['currency'] >= upgrade['price']:
-                            settings['currency'] -= upgrade['price']
-                            settings['purchased_upgrades'].append(upgrade['id'])
-                            pygame.mixer.Sound.play(upgrade_select_sound)
-                            save_settings(settings)
-                        else:
-                            error_sound.play()
-                    save_settings(settings)
-        
-        # Очистка экрана
-        screen.fill(BACKGROUND_COLOR)
-        
+    def draw(surface):
         # Заголовок магазина
         title_text = title_font.render(get_text('shop_title'), True, TEXT_COLOR)
-        screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 30))
+        surface.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 30))
         
         # Отображение текущей валюты
         currency_text = get_text('currency_display').format(settings['currency'])
         currency_surface = shop_font.render(currency_text, True, TEXT_COLOR)
-        screen.blit(currency_surface, (SCREEN_WIDTH - currency_surface.get_width() - 50, 30))
+        surface.blit(currency_surface, (SCREEN_WIDTH - currency_surface.get_width() - 50, 30))
         
         # Отображение списка улучшений в виде карточек
         for idx, upgrade in enumerate(shop_upgrades):
@@ -1493,21 +2503,24 @@ def shop_menu():
             
             if is_selected:
                 # Рисуем границу с акцентом
-                pygame.draw.rect(screen, accent_color, (50, y, card_width, card_height), 2)
+                pygame.draw.rect(surface, accent_color, (50, y, card_width, card_height), 2)
             else:
                 # Рисуем обычную белую границу
-                pygame.draw.rect(screen, border_color, (50, y, card_width, card_height), 1)
+                pygame.draw.rect(surface, border_color, (50, y, card_width, card_height), 1)
             
             # Название улучшения
             name = get_text(upgrade['name_key'])
             name_surface = shop_font.render(name, True, TEXT_COLOR)
-            screen.blit(name_surface, (60, y + 10))
+            surface.blit(name_surface, (60, y + 10))
             
             # Описание улучшения с обертыванием текста
-            description = get_text(upgrade['description_key'])
-            wrapped_description = render_wrapped_text(description, desc_font, TEXT_COLOR, max_description_width)
+            description_key = (settings['language'], upgrade['id'])
+            if description_key not in wrapped_descriptions:
+                description = get_text(upgrade['description_key'])
+                wrapped_descriptions[description_key] = render_wrapped_text(description, desc_font, TEXT_COLOR, max_description_width)
+            wrapped_description = wrapped_descriptions[description_key]
             for line_idx, line in enumerate(wrapped_description):
-                screen.blit(line, (60, y + 40 + line_idx * 20))
+                surface.blit(line, (60, y + 40 + line_idx * 20))
             
             # Кнопка купить/продать
             if upgrade['id'] in settings['purchased_upgrades']:
@@ -1522,90 +2535,73 @@ def shop_menu():
             button_surface = button_font.render(button_text, True, button_color)
             button_rect = button_surface.get_rect()
             button_rect.topleft = (SCREEN_WIDTH - 173, y + 10)
-            screen.blit(button_surface, button_rect)
+            surface.blit(button_surface, button_rect)
             
             # Отображение цены рядом с кнопкой
             price_surface = shop_font.render(price_display, True, TEXT_COLOR)
-            screen.blit(price_surface, (SCREEN_WIDTH - 160, y + 50))
+            surface.blit(price_surface, (SCREEN_WIDTH - 160, y + 50))
         
         # Кнопка выхода из магазина
         back_text = get_text('esc_to_menu')
         back_surface = button_font.render(back_text, True, TEXT_COLOR)
         back_rect = back_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50))
-        screen.blit(back_surface, back_rect)
-        
-        # Обработка выхода из магазина при нажатии Esc
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_ESCAPE]:
-            shop_running = False
-        
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
-
-        # Наложение VHS эффекта на экран
-        screen.blit(chromatic_surface, (0, 0))
-        
-        pygame.display.flip()
-        clock.tick(60)
+        surface.blit(back_surface, back_rect)
 
-def settings_menu():
-    settings_running = True
-    selected_option = 0
-    options = [
-        get_text('resolution'),
-        get_text('fullscreen_mode'),
-        get_text('music_volume'),
-        get_text('hit_volume'),
-        get_text('other_sounds_volume'),
-        get_text('language'),
-        get_text('back')
-    ]
+    menu_screen = MenuScreen(draw)
+    while shop_running:
+        menu_screen.show()
 
-    while settings_running:
-        for event in pygame.event.get():
+        for event in menu_screen.wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    selected_option = (selected_option - 1) % len(options)
-                elif event.key == pygame.K_DOWN:
-                    selected_option = (selected_option + 1) % len(options)
+                if event.key == pygame.K_ESCAPE:
+                    # Выход из магазина при нажатии Esc
+                    shop_running = False
+                elif event.key == pygame.K_UP:
+                    selected_option = (selected_option - 1) % len(shop_upgrades)
+                elif event.key == pygame.K_DOWN:
+                    selected_option = (selected_option + 1) % len(shop_upgrades)
                 elif event.key == pygame.K_RETURN:
-                    current_option = options[selected_option]
-                    if current_option == get_text('resolution'):
-                        change_resolution()
-                    elif current_option == get_text('fullscreen_mode'):
-                        settings['fullscreen'] = not settings['fullscreen']
-                        apply_display_settings()
-                    elif current_option == get_text('music_volume'):
-                        adjust_volume('volume_music')
-                    elif current_option == get_text('hit_volume'):
-                        adjust_volume('volume_hits')
-                    elif current_option == get_text('other_sounds_volume'):
-                        adjust_volume('volume_other')
-                    elif current_option == get_text('language'):
-                        change_language()
-                    elif current_option == get_text('back'):
-                        settings_running = False
-                        
-        options = [
-            get_text('resolution'),
-            get_text('fullscreen_mode'),
-            get_text('music_volume'),
-            get_text('hit_volume'),
-            get_text('other_sounds_volume'),
-            get_text('language'),
-            get_text('back')
-        ]
-                        
-        # Очистка экрана
-        screen.fill(BACKGROUND_COLOR)
+                    upgrade = shop_upgrades[selected_option]
+                    if upgrade['id'] in settings['purchased_upgrades']:
+                        # Продажа улучшения
+                        sell_price = upgrade['price'] / 2
+                        settings['currency'] += sell_price
+                        settings['purchased_upgrades'].remove(upgrade['id'])
+                        upgrade_select_sound.play()
+                        save_settings(settings)
+                    else:
+                        # Покупка улучшения
+                        if settings['currency'] >= upgrade['price']:
+                            settings['currency'] -= upgrade['price']
+                            settings['purchased_upgrades'].append(upgrade['id'])
+                            upgrade_select_sound.play()
+                            save_settings(settings)
+                        else:
+                            error_sound.play()
+                    save_settings(settings)
 
+def settings_menu():
+    settings_running = True
+    selected_option = 0
+    options = [
+        get_text('resolution'),
+        get_text('render_resolution'),
+        get_text('fullscreen_mode'),
+        get_text('music_volume'),
+        get_text('hit_volume'),
+        get_text('other_sounds_volume'),
+        get_text('language'),
+        get_text('back')
+    ]
+    title_font = pygame.font.SysFont('Courier', 48)
+
+    def draw(surface):
         # Отображение заголовка меню настроек
-        settings_title = pygame.font.SysFont('Courier', 48).render(get_text('settings'), True, TEXT_COLOR)
-        screen.blit(settings_title, (SCREEN_WIDTH // 2 - settings_title.get_width() // 2, 150))
+        settings_title = title_font.render(get_text('settings'), True, TEXT_COLOR)
+        surface.blit(settings_title, (SCREEN_WIDTH // 2 - settings_title.get_width() // 2, 150))
 
         # Отображение опций настроек с текущими значениями
         for i, option in enumerate(options):
@@ -1614,6 +2610,8 @@ def settings_menu():
                 option_display = f"{option}: {status}"
             elif option == get_text('resolution'):
                 option_display = f"{option}: {settings['resolution'][0]}x{settings['resolution'][1]}"
+            elif option == get_text('render_resolution'):
+                option_display = f"{option}: {format_resolution(settings['render_resolution'], get_text('native'))}"
             elif option in [get_text('music_volume'), get_text('hit_volume'), get_text('other_sounds_volume')]:
                 volume_key_map = {
                     get_text('music_volume'): 'volume_music',
@@ -1631,33 +2629,71 @@ def settings_menu():
             if i == selected_option:
                 option_display = '> ' + option_display
             option_text = font.render(option_display, True, TEXT_COLOR)
-            screen.blit(option_text, (SCREEN_WIDTH // 2 - option_text.get_width() // 2, 230 + i * 50))
-            
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
+            surface.blit(option_text, (SCREEN_WIDTH // 2 - option_text.get_width() // 2, 230 + i * 50))
 
-        # Наложение VHS эффекта на экран
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
+    menu_screen = MenuScreen(draw)
+    while settings_running:
+        menu_screen.show()
 
-        pygame.display.flip()
-        clock.tick(60)
+        for event in menu_screen.wait_events():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_UP:
+                    selected_option = (selected_option - 1) % len(options)
+                elif event.key == pygame.K_DOWN:
+                    selected_option = (selected_option + 1) % len(options)
+                elif event.key == pygame.K_RETURN:
+                    current_option = options[selected_option]
+                    if current_option == get_text('resolution'):
+                        change_resolution()
+                    elif current_option == get_text('render_resolution'):
+                        change_resolution('render_resolution')
+                    elif current_option == get_text('fullscreen_mode'):
+                        settings['fullscreen'] = not settings['fullscreen']
+                        apply_display_settings()
+                    elif current_option == get_text('music_volume'):
+                        adjust_volume('volume_music')
+                    elif current_option == get_text('hit_volume'):
+                        adjust_volume('volume_hits')
+                    elif current_option == get_text('other_sounds_volume'):
+                        adjust_volume('volume_other')
+                    elif current_option == get_text('language'):
+                        change_language()
+                    elif current_option == get_text('back'):
+                        settings_running = False
+                        
+        options = [
+            get_text('resolution'),
+            get_text('render_resolution'),
+            get_text('fullscreen_mode'),
+            get_text('music_volume'),
+            get_text('hit_volume'),
+            get_text('other_sounds_volume'),
+            get_text('language'),
+            get_text('back')
+        ]
 
-def change_resolution():
-    resolutions = [
-        (1280, 720),
-        (1366, 768),
-        (1600, 768),
-        (1600, 900),
-    ]
+def change_resolution(setting_key='resolution'):
+    resolutions = list(RESOLUTIONS)
+    if setting_key == 'render_resolution':
+        resolutions.insert(0, None)  # Отрисовка в разрешении окна
     try:
-        res_selected = resolutions.index(settings['resolution'])
+        res_selected = resolutions.index(settings[setting_key])
     except ValueError:
         res_selected = 0
     changing_resolution = True
+
+    def draw(surface):
+        resolution_text = font.render(f"{get_text(setting_key)}: {format_resolution(resolutions[res_selected], get_text('native'))}", True, TEXT_COLOR)
+        surface.blit(resolution_text, (SCREEN_WIDTH // 2 - resolution_text.get_width() // 2, SCREEN_HEIGHT // 2))
+
+    menu_screen = MenuScreen(draw)
     while changing_resolution:
-        for event in pygame.event.get():
+        menu_screen.show()
+
+        for event in menu_screen.wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1667,41 +2703,16 @@ def change_resolution():
                 elif event.key == pygame.K_RIGHT:
                     res_selected = (res_selected + 1) % len(resolutions)
                 elif event.key == pygame.K_RETURN:
-                    settings['resolution'] = resolutions[res_selected]
+                    settings[setting_key] = resolutions[res_selected]
                     apply_display_settings()
                     changing_resolution = False
                 elif event.key == pygame.K_ESCAPE:
                     changing_resolution = False
-        screen.fill(BACKGROUND_COLOR)
-        resolution_text = font.render(f"Resolution: {resolutions[res_selected][0]}x{resolutions[res_selected][1]}", True, TEXT_COLOR)
-        screen.blit(resolution_text, (SCREEN_WIDTH // 2 - resolution_text.get_width() // 2, SCREEN_HEIGHT // 2))
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
-        pygame.display.flip()
-        clock.tick(60)
 
 def adjust_volume(volume_key):
     adjusting = True
-    while adjusting:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    settings[volume_key] = max(0.0, settings[volume_key] - 0.05)
-                    apply_volume_settings()
-                elif event.key == pygame.K_RIGHT:
-                    settings[volume_key] = min(1.0, settings[volume_key] + 0.05)
-                    apply_volume_settings()
-                elif event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE:
-                    adjusting = False
-
-        # Очистка экрана
-        screen.fill(BACKGROUND_COLOR)
 
+    def draw(surface):
         # Отображение текущего уровня громкости
         volume_value = int(settings[volume_key] * 100)
         # Определение ключа для локализации
@@ -1712,18 +2723,25 @@ def adjust_volume(volume_key):
         }
 
         volume_text = font.render(f"{get_text(volume_key_map.get(volume_key, volume_key))}: {volume_value}%", True, TEXT_COLOR)
-        screen.blit(volume_text, (SCREEN_WIDTH // 2 - volume_text.get_width() // 2, SCREEN_HEIGHT // 2))
+        surface.blit(volume_text, (SCREEN_WIDTH // 2 - volume_text.get_width() // 2, SCREEN_HEIGHT // 2))
 
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
-
-        # Наложение VHS эффекта на экран
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
+    menu_screen = MenuScreen(draw)
+    while adjusting:
+        menu_screen.show()
 
-        pygame.display.flip()
-        clock.tick(60)
+        for event in menu_screen.wait_events():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT:
+                    settings[volume_key] = max(0.0, settings[volume_key] - 0.05)
+                    apply_volume_settings()
+                elif event.key == pygame.K_RIGHT:
+                    settings[volume_key] = min(1.0, settings[volume_key] + 0.05)
+                    apply_volume_settings()
+                elif event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE:
+                    adjusting = False
         
 def change_language():
     languages = ['en', 'ru']
@@ -1734,9 +2752,20 @@ def change_language():
     current_lang_index = languages.index(settings['language']) if settings['language'] in languages else 0
     
     changing_language = True
+
+    def draw(surface):
+        # Отображение текущего выбора языка
+        language_text = get_text('language')
+        selected_lang = lang_names[languages[current_lang_index]]
+        display_text = f"{language_text}: {selected_lang}"
+        lang_display = font.render(display_text, True, TEXT_COLOR)
+        surface.blit(lang_display, (SCREEN_WIDTH // 2 - lang_display.get_width() // 2, SCREEN_HEIGHT // 2))
     
+    menu_screen = MenuScreen(draw)
     while changing_language:
-        for event in pygame.event.get():
+        menu_screen.show()
+
+        for event in menu_screen.wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1752,27 +2781,6 @@ def change_language():
                 elif event.key == pygame.K_ESCAPE:
                     changing_language = False
         
-        # Очистка экрана
-        screen.fill(BACKGROUND_COLOR)
-        
-        # Отображение текущего выбора языка
-        language_text = get_text('language')
-        selected_lang = lang_names[languages[current_lang_index]]
-        display_text = f"{language_text}: {selected_lang}"
-        lang_display = font.render(display_text, True, TEXT_COLOR)
-        screen.blit(lang_display, (SCREEN_WIDTH // 2 - lang_display.get_width() // 2, SCREEN_HEIGHT // 2))
-        
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
-        
-        # Наложение VHS эффекта на экран
-        chromatic_surface.blit(chromatic_surface, (0, 0))
-        screen.blit(chromatic_surface, (0, 0))
-        
-        pygame.display.flip()
-        clock.tick(60)
-        
 def render_wrapped_text(text, font, color, max_width):
     words = text.split(' ')
     lines = []
@@ -1799,9 +2807,25 @@ def select_start_wave():
     
     selection_font = pygame.font.SysFont('Courier', 36)
     instruction_font = pygame.font.SysFont('Courier', 24)
+
+    def draw(surface):
+        # Заголовок выбора волны
+        title_text = selection_font.render(get_text('wave_selection_title'), True, TEXT_COLOR)
+        surface.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 100))
     
+        # Выбор волны
+        wave_text = font.render(f"{get_text('wave')}: {selected_wave}", True, TEXT_COLOR)
+        surface.blit(wave_text, (SCREEN_WIDTH // 2 - wave_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
+    
+        # Инструкция
+        instruction_text = instruction_font.render(get_text('wave_selection_instruction'), True, TEXT_COLOR)
+        surface.blit(instruction_text, (SCREEN_WIDTH // 2 - instruction_text.get_width() // 2, SCREEN_HEIGHT // 2 + 20))
+    
+    menu_screen = MenuScreen(draw)
     while selecting:
-        for event in pygame.event.get():
+        menu_screen.show()
+
+        for event in menu_screen.wait_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -1815,61 +2839,774 @@ def select_start_wave():
                 elif event.key == pygame.K_ESCAPE:
                     selecting = False
     
-        # Очистка экрана
-        screen.fill(BACKGROUND_COLOR)
-    
-        # Заголовок выбора волны
-        title_text = selection_font.render(get_text('wave_selection_title'), True, TEXT_COLOR)
-        screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 100))
-    
-        # Выбор волны
-        wave_text = font.render(f"{get_text('wave')}: {selected_wave}", True, TEXT_COLOR)
-        screen.blit(wave_text, (SCREEN_WIDTH // 2 - wave_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
-    
-        # Инструкция
-        instruction_text = instruction_font.render(get_text('wave_selection_instruction'), True, TEXT_COLOR)
-        screen.blit(instruction_text, (SCREEN_WIDTH // 2 - instruction_text.get_width() // 2, SCREEN_HEIGHT // 2 + 20))
-    
-        # Применение VHS эффектов
-        chromatic_surface = chromatic_aberration(screen.copy())
-        apply_scanlines(chromatic_surface)
-    
-        # Наложение VHS эффекта на экран
-        screen.blit(chromatic_surface, (0, 0))
-    
-        pygame.display.flip()
-        clock.tick(60)
-    
     return selected_wave
 
+# Источник ввода по умолчанию: живая мышь и меню улучшений
+class MouseInput:
+    def get_pos(self, session):
+        return window_to_screen(pygame.mouse.get_pos())
+
+    def choose_upgrade(self, player):
+        return upgrade_menu(player)
+
+# Скриптовый ввод для безголового режима: простой бот, ведущий курсор по состоянию игры
+class ScriptedInput:
+    def __init__(self, upgrade_order=('damage', 'hp', 'defense')):
+        self.upgrade_order = upgrade_order
+        self.upgrades_taken = 0
+
+    def get_pos(self, session):
+        player = session.player
+        target_x, target_y = player.x, player.y
+        threat = None
+        threat_distance = 90
+
+        # Убегаем от ближайшего красного (атакующего) врага
+        for enemy in session.enemies:
+            if enemy.color == ENEMY_COLOR or (enemy.is_boss and enemy.is_red):
+                distance = math.sqrt((enemy.x - player.x) ** 2 + (enemy.y - player.y) ** 2)
+                if distance < threat_distance:
+                    threat, threat_distance = (enemy.x, enemy.y), distance
+        # Снаряды ближе 60 пикселей опаснее врагов
+        projectiles = session.projectiles
+        if projectiles.count:
+            distances = np.hypot(projectiles.x[:projectiles.count] - player.x, projectiles.y[:projectiles.count] - player.y)
+            nearest = int(distances.argmin())
+            if distances[nearest] < 60:
+                threat = (projectiles.x[nearest], projectiles.y[nearest])
+        if threat is not None:
+            away_x = player.x - threat[0]
+            away_y = player.y - threat[1]
+            length = math.sqrt(away_x ** 2 + away_y ** 2) or 1
+            target_x = player.x + away_x / length * 150
+            target_y = player.y + away_y / length * 150
+        elif session.health_pickups and player.hp < player.max_hp / 2:
+            # Раненый бот идёт за ближайшей аптечкой
+            pickup = min(session.health_pickups, key=lambda p: (p.x - player.x) ** 2 + (p.y - player.y) ** 2)
+            target_x, target_y = pickup.x, pickup.y
+        else:
+            # Иначе атакуем ближайшего неопасного врага
+            candidates = [enemy for enemy in session.enemies if not enemy.is_dead]
+            if candidates:
+                enemy = min(candidates, key=lambda e: (e.x - player.x) ** 2 + (e.y - player.y) ** 2)
+                target_x, target_y = enemy.x, enemy.y
+
+        target_x = max(0, min(target_x, SCREEN_WIDTH - 1))
+        target_y = max(0, min(target_y, SCREEN_HEIGHT - 1))
+        return int(target_x), int(target_y)
+
+    def choose_upgrade(self, player):
+        selected = self.upgrade_order[self.upgrades_taken % len(self.upgrade_order)]
+        apply_upgrade(player, selected)
+        self.upgrades_taken += 1
+        return selected
+
+# Повторы забегов. Симуляция зависит только от сида, стартового состояния и ввода по шагам,
+# поэтому файл хранит заголовок (JSON) и сжатый поток записей:
+# шаг с новой позицией мыши, шаг с прежней позицией, начало волны и выбор улучшения (клавиши 1-3)
+REPLAY_MAGIC = b'AKEDOREPLAY'
+REPLAY_VERSION = 4
+REPLAY_TICK_MOVE = 0  # За тегом два int16: x, y
+REPLAY_TICK_SAME = 1
+REPLAY_WAVE_START = 2
+REPLAY_UPGRADE = 3  # За тегом индекс в UPGRADE_CHOICES
+UPGRADE_CHOICES = ('hp', 'damage', 'defense')
+
+def session_checksum(session):
+    # Отпечаток состояния забега: совпадает, только если повтор прошёл шаг в шаг
+    player = session.player
+    state = [session.wave, session.kills, player.x, player.y, player.hp, player.exp, player.level, player.damage,
+             len(session.projectiles)]
+    for enemy in session.enemies:
+        state.extend((type(enemy).__name__, enemy.x, enemy.y, enemy.hp))
+    return hashlib.sha1(repr(state).encode()).hexdigest()
+
+# Источник ввода, который пишет всё, что отдаёт обёрнутый источник
+class ReplayRecorder:
+    def __init__(self, input_source, seed, start_wave, start_ticks):
+        self.input_source = input_source
+        self.header = {
+            'version': REPLAY_VERSION,
+            'seed': seed,
+            'start_wave': start_wave,
+            'start_ticks': start_ticks,
+            'purchased_upgrades': list(settings['purchased_upgrades']),
+            'screen_size': [SCREEN_WIDTH, SCREEN_HEIGHT],
+            'tick_rate': SIMULATION_TICK_RATE,
+            'swarm_engine': USE_SWARM_ENGINE,
+            'ai_lod': USE_AI_LOD,
+            'countdown_ms': WAVE_COUNTDOWN_MS
+        }
+        self.stream = bytearray()
+        self.last_pos = None
+        self.ticks = 0
+        self.checksum = None  # Отпечаток последнего шага, снятый до экрана конца игры
+
+    def get_pos(self, session):
+        pos = self.input_source.get_pos(session)
+        if pos == self.last_pos:
+            self.stream.append(REPLAY_TICK_SAME)
+        else:
+            self.stream.append(REPLAY_TICK_MOVE)
+            self.stream += struct.pack('<hh', *pos)
+            self.last_pos = pos
+        self.ticks += 1
+        return pos
+
+    def choose_upgrade(self, player):
+        selected = self.input_source.choose_upgrade(player)
+        self.stream.append(REPLAY_UPGRADE)
+        self.stream.append(UPGRADE_CHOICES.index(selected))
+        return selected
+
+    def record_wave_start(self):
+        self.stream.append(REPLAY_WAVE_START)
+
+    def finish(self, session):
+        # Экран конца игры конвертирует опыт в $ и обнуляет его — повтор же заканчивается на последнем шаге
+        self.checksum = session_checksum(session)
+
+    def save(self, path, session):
+        checksum = self.checksum if self.checksum is not None else session_checksum(session)
+        header = dict(self.header, ticks=self.ticks, checksum=checksum)
+        header_bytes = json.dumps(header).encode()
+        with open(path, 'wb') as replay_file:
+            replay_file.write(REPLAY_MAGIC)
+            replay_file.write(struct.pack('<I', len(header_bytes)))
+            replay_file.write(header_bytes)
+            replay_file.write(zlib.compress(bytes(self.stream)))
+
+def load_replay(path):
+    # Возвращает заголовок и список записей (тег, значение)
+    with open(path, 'rb') as replay_file:
+        data = replay_file.read()
+    if not data.startswith(REPLAY_MAGIC):
+        raise ValueError(f'{path} is not an Akedo replay')
+    offset = len(REPLAY_MAGIC)
+    header_length, = struct.unpack_from('<I', data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset + header_length])
+    if header['version'] != REPLAY_VERSION:
+        raise ValueError(f"unsupported replay version {header['version']}")
+    stream = zlib.decompress(data[offset + header_length:])
+
+    records = []
+    pos = None
+    index = 0
+    while index < len(stream):
+        tag = stream[index]
+        index += 1
+        if tag == REPLAY_TICK_MOVE:
+            pos = struct.unpack_from('<hh', stream, index)
+            index += 4
+            records.append((REPLAY_TICK_MOVE, pos))
+        elif tag == REPLAY_TICK_SAME:
+            records.append((REPLAY_TICK_MOVE, pos))
+        elif tag == REPLAY_WAVE_START:
+            records.append((REPLAY_WAVE_START, None))
+        elif tag == REPLAY_UPGRADE:
+            records.append((REPLAY_UPGRADE, UPGRADE_CHOICES[stream[index]]))
+            index += 1
+        else:
+            raise ValueError(f'corrupt replay stream: unknown tag {tag}')
+    return header, records
+
+# Источник ввода для воспроизведения: позицию на шаг выставляет run_replay, улучшения читаются из потока
+class ReplayInput:
+    def __init__(self, records):
+        self.records = iter(records)
+        self.pos = None
+
+    def get_pos(self, session):
+        return self.pos
+
+    def choose_upgrade(self, player):
+        tag, selected = next(self.records)
+        if tag != REPLAY_UPGRADE:
+            raise ValueError('replay desynced: expected an upgrade choice')
+        apply_upgrade(player, selected)
+        return selected
+
+# Игровая сессия: состояние забега и логика кадра из main() без ввода с клавиатуры, меню и вывода на экран
+# Менеджер лимитов живых сущностей забега (лимиты — ENTITY_BUDGETS)
+# Враги и снаряды сверх лимита ждут в очереди и входят в игру по мере освобождения мест,
+# числа урона сливаются с последним похожим числом или отбрасываются. stats считает, как часто лимиты срабатывали
+class EntityBudget:
+    def __init__(self, limits=None):
+        self.limits = dict(ENTITY_BUDGETS if limits is None else limits)
+        self.enemy_queue = deque()  # Готовый враг или (класс, аргументы) — создаётся, когда для него найдётся место
+        self.projectile_queue = deque()  # (x, y, dx, dy, damage, follow_player)
+        self.stats = Counter()
+
+    def admit_enemy(self, enemies, spawn):
+        # Очередь честная: пока в ней кто-то ждёт, новые враги встают за ними
+        if len(enemies) < self.limits['enemies'] and not self.enemy_queue:
+            enemies.append(spawn if isinstance(spawn, Enemy) else spawn[0](*spawn[1]))
+            return
+        self.queue_enemies([spawn])
+
+    def queue_enemies(self, spawns):
+        self.enemy_queue.extend(spawns)
+        self.stats['enemies_cap_hits'] += len(spawns)
+        self.stats['enemies_peak_queue'] = max(self.stats['enemies_peak_queue'], len(self.enemy_queue))
+
+    def defer_overflow(self, enemies, first_new):
+        # Враги, добавленные в список в обход admit_enemy (призыв босса), уходят в очередь, если не помещаются
+        cut = max(first_new, self.limits['enemies'])
+        if len(enemies) > cut:
+            self.queue_enemies(enemies[cut:])
+            del enemies[cut:]
+
+    def release_enemies(self, enemies):
+        free = self.limits['enemies'] - len(enemies)
+        if free <= 0 or not self.enemy_queue:
+            return
+        current_time = game_clock.get_ticks()
+        while free > 0 and self.enemy_queue:
+            spawn = self.enemy_queue.popleft()
+            enemy = spawn if isinstance(spawn, Enemy) else spawn[0](*spawn[1])
+            if enemy.timer_driven:
+                timers.schedule(enemy, current_time)  # Таймер ожидавшего в очереди врага мог сработать без него
+            enemies.append(enemy)
+            free -= 1
+            self.stats['enemies_released'] += 1
+
+    def queue_projectiles(self, projectiles):
+        self.stats['projectiles_cap_hits'] += len(projectiles)
+        room = PROJECTILE_QUEUE_LIMIT - len(self.projectile_queue)
+        if len(projectiles) > room:
+            self.stats['projectiles_dropped'] += len(projectiles) - max(room, 0)
+            projectiles = projectiles[:max(room, 0)]
+        self.projectile_queue.extend(projectiles)
+        self.stats['projectiles_peak_queue'] = max(self.stats['projectiles_peak_queue'], len(self.projectile_queue))
+
+    def release_projectiles(self, store):
+        # Снаряд из очереди вылетает из точки выстрела в момент входа, чтобы start_time в хранилище не убывал
+        free = self.limits['projectiles'] - len(store)
+        released = 0
+        while released < free and self.projectile_queue:
+            store.insert(*self.projectile_queue.popleft())
+            released += 1
+        self.stats['projectiles_released'] += released
+
+    def merge_damage_number(self, pool, value, color):
+        self.stats['damage_numbers_cap_hits'] += 1
+        if isinstance(value, (int, float)):
+            # Прибавляем к самому свежему числу того же цвета и продлеваем его жизнь
+            for i in range(pool.count - 1, -1, -1):
+                if pool.colors[i] == color:
+                    try:
+                        total = float(pool.texts[i]) + value
+                    except ValueError:
+                        break
+                    pool.texts[i] = str(round(total, 1))
+                    pool.start_time[i] = game_clock.get_ticks()
+                    self.stats['damage_numbers_merged'] += 1
+                    return
+        self.stats['damage_numbers_dropped'] += 1
+
+    def summary(self):
+        return {key: self.stats[key] for key in sorted(self.stats)}
+
+# Следующая волна, которую собирают заранее — в свободное время кадров отсчёта перед ней
+# Игровые часы переводятся на время отсчёта до его начала и дальше стоят, а случайные числа тянутся в том же порядке, поэтому волна
+# получается точно такой же, как если бы её собрали целиком в start_next_wave
+class PreparedWave:
+    def __init__(self, session):
+        self.wave = session.wave
+        self.is_boss = self.wave % 10 == 5
+        self.budget = session.budget
+        self.enemies = []
+        if self.is_boss:
+            self.spawns = iter([(Boss, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, session.boss_appearance_number, self.wave))])
+        else:
+            self.spawns = iter_enemy_spawns(self.wave * INITIAL_ENEMY_COUNT, self.wave, session.swarm)
+        self.done = False
+
+    def advance(self, deadline=None):
+        # Создаёт врагов, пока не наступит deadline (None — до конца); возвращает True, когда волна готова
+        while not self.done:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            spawn = next(self.spawns, None)
+            if spawn is None:
+                self.done = True
+                if self.is_boss and boss_font is not None:
+                    # Глифы босса растеризуются заранее, а не в первом кадре боя
+                    for color in (ENEMY_DEFAULT_COLOR, ENEMY_COLOR):
+                        get_glyph(Boss.symbol, boss_font, color)
+            else:
+                self.budget.admit_enemy(self.enemies, spawn)
+        return True
+
+class GameSession:
+    def __init__(self, start_wave=1, input_source=None):
+        self.input_source = input_source or MouseInput()
+        self.player = Player(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self.player.choose_upgrade = self.input_source.choose_upgrade
+        self.enemies = []
+        self.budget = EntityBudget()  # Лимиты живых врагов, снарядов и чисел урона
+        self.damage_numbers = DamageNumberPool(budget=self.budget)
+        self.health_pickups = []
+        self.projectiles = ProjectileStore(budget=self.budget)
+        self.wave = start_wave
+        self.wave_start_time = game_clock.get_ticks()
+        self.enemy_grid = SpatialHash()  # Сетка для разведения врагов друг от друга
+        self.swarm = SwarmEngine() if USE_SWARM_ENGINE else None  # Пакетное обновление обычных врагов и стрелков
+        self.ai_scheduler = AIScheduler() if USE_AI_LOD else None  # Пересчёт движения дальних врагов по очереди
+        timers.clear()  # Таймеры прошлого забега больше не нужны
+        self.boss_appearance_number = 1  # Счетчик появлений босса
+        self.prepared_wave = None  # Следующая волна, собираемая во время отсчёта
+        self.in_boss_fight = False
+        self.mouse_x, self.mouse_y = self.player.x, self.player.y
+        self.kills = 0
+
+    def prepare_next_wave(self, deadline=None):
+        # Сборка следующей волны по частям; возвращает True, когда она готова
+        if self.prepared_wave is None or self.prepared_wave.wave != self.wave:
+            self.prepared_wave = PreparedWave(self)
+        return self.prepared_wave.advance(deadline)
+
+    def start_next_wave(self):
+        self.wave_start_time = game_clock.get_ticks()
+        # Волна, собранная во время отсчёта, или собираем её сейчас (без отсчёта — безголовый режим, повторы)
+        self.prepare_next_wave()
+        prepared = self.prepared_wave
+        self.prepared_wave = None
+        if prepared.is_boss:
+            self.in_boss_fight = True
+            # Останавливаем основную музыку
+            pygame.mixer.music.stop()
+            # Воспроизводим музыку босса
+            if not music_channel.get_busy():
+                music_channel.play(boss_music.get(), -1)
+            self.boss_appearance_number += 1
+        else:
+            self.in_boss_fight = False
+        self.enemies = prepared.enemies
+        self.wave += 1
+
+    def end_boss_fight(self):
+        if self.in_boss_fight:
+            self.in_boss_fight = False
+            # Останавливаем музыку босса и запускаем основную
+            boss_music.stop()
+            pygame.mixer.music.play(-1, 0.0)
+
+    def earned_currency(self):
+        # Конвертация опыта в $
+        return self.player.exp / 15 * self.wave
+
+    def update(self, delta_time):
+        # Один кадр игровой логики; возвращает True, если игрок погиб
+        self.update_entities(delta_time)
+        return self.resolve_collisions()
+
+    def save_positions(self):
+        # Запоминаем позиции перед шагом, чтобы отрисовка могла интерполировать между шагами
+        self.player.prev_x, self.player.prev_y = self.player.x, self.player.y
+        for enemy in self.enemies:
+            enemy.prev_x, enemy.prev_y = enemy.x, enemy.y
+        self.projectiles.save_positions()
+
+    def update_entities(self, delta_time):
+        # Движение игрока, врагов и снарядов
+        player = self.player
+        enemies = self.enemies
+        projectiles = self.projectiles
+        enemy_grid = self.enemy_grid
+        self.save_positions()
+        self.mouse_x, self.mouse_y = self.input_source.get_pos(self)
+        player.move(self.mouse_x, self.mouse_y)
+
+        # Обновление врагов
+        if self.swarm is not None:
+            obstacles = [enemy for enemy in enemies if not isinstance(enemy, SwarmEnemy)]
+            for shooter in self.swarm.step(player.x, player.y, delta_time, obstacles):
+                projectile = shooter.fire_projectile(player.x, player.y)
+                if projectile:
+                    projectiles.append(projectile)
+        enemy_grid.rebuild(enemies)
+        current_time = game_clock.get_ticks()
+        due = timers.pop_due(current_time)  # Враги, чьи таймеры сработали к этому шагу
+        ai_scheduler = self.ai_scheduler
+        if ai_scheduler is not None:
+            ai_scheduler.begin_step()
+        for enemy in enemies:
+            if isinstance(enemy, SwarmEnemy):
+                continue  # Рой уже обновлён пакетно
+            if ai_scheduler is not None:
+                ai_scheduler.move(enemy, player.x, player.y, enemy_grid)
+            else:
+                enemy.move_towards_player(player.x, player.y, enemy_grid)
+            if enemy.is_boss:
+                enemy_count = len(enemies)
+                enemy.update(delta_time, player.x, player.y, projectiles, enemies)
+                self.budget.defer_overflow(enemies, enemy_count)
+                # Призванные боссом враги сразу попадают в сетку
+                for summoned in enemies[enemy_count:]:
+                    enemy_grid.update(summoned)
+            elif enemy in due:
+                if isinstance(enemy, RusherEnemy):
+                    enemy.update(player.x, player.y, delta_time)
+                else:
+                    enemy.update(delta_time)
+                    if not enemy.is_dead and enemy.is_shooter:
+                        projectile = enemy.shoot(player.x, player.y)
+                        if projectile:
+                            projectiles.append(projectile)
+                timers.schedule(enemy, enemy.next_wake(current_time))
+            # Враг сдвинулся — обновляем его ячейку для следующих соседей
+            enemy_grid.update(enemy)
+
+        # Погибшие смертники взрываются и убираются из списка за один проход
+        remaining = []
+        for enemy in enemies:
+            if enemy.is_dead and isinstance(enemy, SuicideEnemy):
+                if enemy.explode:
+                    # Воспроизводим звук взрыва или выстрела
+                    if not shooter_fire_channel.get_busy():
+                        shooter_fire_channel.play(shooter_fire_sound.get())
+
+                    # Враг взрывается и выпускает снаряды
+                    emit_pattern(projectiles, 'suicide_explosion', enemy.x, enemy.y, enemy.damage, count=min(6 + enemy.wave, 12))
+                enemy_grid.remove(enemy)  # Сетка нужна столкновениям этого же шага
+            else:
+                remaining.append(enemy)
+        if len(remaining) != len(enemies):
+            self.enemies = remaining
+
+        projectiles.update(player.x, player.y)
+
+    def resolve_collisions(self):
+        # Столкновения, подбор аптечек и удаление погибших; возвращает True, если игрок погиб
+        player = self.player
+        enemies = self.enemies
+
+        # Обработка столкновений и проверка на окончание игры
+        if handle_collisions(player, enemies, self.damage_numbers, self.wave, self.wave_start_time, self.projectiles, self.health_pickups,
+                             self.enemy_grid):
+            return True
+
+        # Обновление чисел урона
+        self.damage_numbers.update()
+
+        # Подбор аптечек здоровья (подобранные убираются за один проход)
+        if self.health_pickups:
+            remaining = []
+            for health_pickup in self.health_pickups:
+                if health_pickup.is_colliding(player):
+                    healed_amount = player.health_pickup_heal_amount
+                    player.heal(healed_amount)
+                    health_pickup_sound.play()
+                    self.damage_numbers.spawn(player.x, player.y, f"+{healed_amount} {get_text('hp')}", (0, 255, 0))
+                else:
+                    remaining.append(health_pickup)
+            self.health_pickups = remaining
+
+        # Удаление мертвых врагов
+        alive = [enemy for enemy in enemies if not enemy.is_dead]
+        self.kills += len(enemies) - len(alive)
+        self.budget.release_enemies(alive)  # Освободившиеся места занимают враги из очереди
+        self.enemies = alive
+
+        if not self.enemies:
+            self.end_boss_fight()
+        return False
+
+    def draw(self, surface, alpha=1.0):
+        player = self.player
+        world_blits = []  # Все глифы мира за кадр выводятся одним вызовом surface.blits
+
+        # Отображение персонажа игрока и курсора
+        player_x, player_y = interpolate_position(player, alpha)
+        queue_glyph(world_blits, PLAYER_SYMBOL, font, PLAYER_COLOR, int(player_x), int(player_y))
+        cursor_symbol = get_glyph('`', font, cursor_color)
+        world_blits.append((cursor_symbol, (self.mouse_x - cursor_symbol.get_width() // 2, self.mouse_y - cursor_symbol.get_height() // 2)))
+
+        # Отображение врагов
+        for enemy in self.enemies:
+            enemy_x, enemy_y = interpolate_position(enemy, alpha)
+            if enemy.is_boss:
+                # Проверка состояния босса для отображения цвета
+                color = ENEMY_COLOR if enemy.is_red else enemy.color
+                queue_glyph(world_blits, enemy.symbol, boss_font, color, enemy_x, enemy_y)
+            elif isinstance(enemy, RusherEnemy):
+                queue_glyph(world_blits, enemy.symbol, font, enemy.color, int(enemy_x), int(enemy_y))
+            elif not enemy.is_dead:
+                if isinstance(enemy, SuicideEnemy):
+                    symbol = enemy.symbol
+                elif enemy.is_shooter:
+                    symbol = SHOOTER_SYMBOL
+                else:
+                    symbol = ENEMY_SYMBOL
+                queue_glyph(world_blits, symbol, font, enemy.color, enemy_x, enemy_y)
+
+        self.projectiles.draw(world_blits, alpha)
+        self.damage_numbers.draw(world_blits)
+        for health_pickup in self.health_pickups:
+            health_pickup.draw(world_blits)
+
+        # Вывод всех глифов мира одним вызовом; возвращаются области, в которые что-то нарисовано
+        drawn_rects = surface.blits(world_blits)
+
+        # Отображение полоски здоровья босса
+        for enemy in self.enemies:
+            if enemy.is_boss:
+                # Размеры полоски HP
+                bar_width = SCREEN_WIDTH * 0.6
+                bar_height = 18
+                bar_x = (SCREEN_WIDTH - bar_width) / 2
+                bar_y = SCREEN_HEIGHT - bar_height - 30  # Отступ от нижнего края
+
+                # Рисуем белую рамку
+                drawn_rects.append(pygame.draw.rect(surface, (255, 255, 255), (bar_x, bar_y, bar_width, bar_height), 1))  # Толщина рамки 1 пиксель
+
+                # Вычисляем ширину заполненной части
+                filled_width = (bar_width - 2) * (enemy.hp / enemy.max_hp)  # Вычитаем 2 пикселя для учёта рамки
+                if filled_width < 0:
+                    filled_width = 0  # Чтобы не было отрицательной ширины
+
+                # Рисуем заполненную часть
+                pygame.draw.rect(surface, (162, 68, 43), (bar_x + 1, bar_y + 1, filled_width, bar_height - 2))
+
+                # Отображаем текст "Boss" над полоской HP
+                boss_text = get_glyph(get_text('boss'), font, (255, 255, 255))
+                text_rect = boss_text.get_rect(center=(SCREEN_WIDTH / 2, bar_y - 10))
+                drawn_rects.append(surface.blit(boss_text, text_rect))
+                break  # Босс только один
+
+        # Отображение статистики игрока (уровень, здоровье и опыт)
+        stats_text = f"{get_text('level')}: {player.level}  {get_text('hp')}: {player.hp:.1f}/{player.max_hp:.1f}  {get_text('defense')}: {player.defense_upgrade_count * 0.2:.1f}  {get_text('exp')}: {player.exp:.1f}/{player.exp_to_level_up}"
+        drawn_rects.append(surface.blit(font.render(stats_text, True, TEXT_COLOR), (10, 10)))
+        return drawn_rects
+
+# Профайлер кадра: F3 включает оверлей с графиком времени кадра, временем фаз и счётчиками сущностей
+# Выключенный профайлер ничего не замеряет — каждая отметка сводится к одной проверке флага
+class FrameProfiler:
+    PHASES = ('update', 'collision', 'render', 'vhs', 'flip', 'overlay')
+    STEP_PHASES = ('update', 'collision')  # Фазы шага симуляции: за кадр их может быть несколько или ни одного
+    GRAPH_WIDTH = 240
+    GRAPH_HEIGHT = 60
+    GRAPH_MAX_MS = 50
+
+    def __init__(self, history=240):
+        self.enabled = False
+        self.frame_times = deque(maxlen=history)
+        self.phase_times = {phase: deque(maxlen=60) for phase in self.PHASES}
+        self.step_totals = dict.fromkeys(self.STEP_PHASES, 0.0)  # Время фаз шага, накопленное за текущий кадр
+        self.frame_start = 0
+        self.mark = 0
+        self.lines = []  # Отрендеренные строки текста, обновляются несколько раз в секунду
+        self.last_text_update = 0
+        self.overlay_font = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_times.clear()
+        for times in self.phase_times.values():
+            times.clear()
+        self.last_text_update = 0
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = self.mark = time.perf_counter()
+            self.step_totals = dict.fromkeys(self.STEP_PHASES, 0.0)
+
+    def lap(self, phase):
+        # Время от предыдущей отметки засчитывается указанной фазе
+        if self.enabled:
+            now = time.perf_counter()
+            self.phase_times[phase].append((now - self.mark) * 1000)
+            self.mark = now
+
+    def step_lap(self, phase):
+        # Как lap(), но время копится по всем шагам кадра и записывается один раз в end_steps()
+        if self.enabled:
+            now = time.perf_counter()
+            self.step_totals[phase] += (now - self.mark) * 1000
+            self.mark = now
+
+    def end_steps(self):
+        # Одна запись на кадр, чтобы фазы шага складывались с остальными во время кадра
+        if self.enabled:
+            for phase, total in self.step_totals.items():
+                self.phase_times[phase].append(total)
+
+    def end_frame(self):
+        if self.enabled:
+            self.frame_times.append((time.perf_counter() - self.frame_start) * 1000)
+
+    def draw(self, surface, session):
+        if not self.enabled:
+            return
+        if self.overlay_font is None:
+            self.overlay_font = pygame.font.SysFont('Courier', 14)
+        now = pygame.time.get_ticks()
+        if now - self.last_text_update >= 250:
+            self.last_text_update = now
+            self.lines = [self.overlay_font.render(line, True, (255, 255, 255)) for line in self.describe(session)]
+
+        line_height = self.overlay_font.get_linesize()
+        panel_height = self.GRAPH_HEIGHT + 10 + line_height * len(self.lines)
+        panel_x = SCREEN_WIDTH - self.GRAPH_WIDTH - 20
+        panel_y = 40
+        panel = pygame.Surface((self.GRAPH_WIDTH + 10, panel_height + 10), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 180))
+
+        # График времени кадра; линия отмечает бюджет 60 FPS
+        budget_y = 5 + self.GRAPH_HEIGHT - self.GRAPH_HEIGHT * (1000 / 60) / self.GRAPH_MAX_MS
+        pygame.draw.line(panel, (80, 80, 80), (5, budget_y), (5 + self.GRAPH_WIDTH, budget_y))
+        if len(self.frame_times) > 1:
+            step = self.GRAPH_WIDTH / (self.frame_times.maxlen - 1)
+            points = [(5 + i * step, 5 + self.GRAPH_HEIGHT - self.GRAPH_HEIGHT * min(frame_ms, self.GRAPH_MAX_MS) / self.GRAPH_MAX_MS)
+                      for i, frame_ms in enumerate(self.frame_times)]
+            pygame.draw.lines(panel, (0, 255, 0), False, points)
+
+        panel.blits([(line, (5, 10 + self.GRAPH_HEIGHT + i * line_height)) for i, line in enumerate(self.lines)], doreturn=False)
+        return surface.blit(panel, (panel_x, panel_y))
+
+    def describe(self, session):
+        lines = []
+        if self.frame_times:
+            frame_times = sorted(self.frame_times)
+            mean_ms = sum(frame_times) / len(frame_times)
+            lines.append(f"frame {mean_ms:6.2f} ms  max {frame_times[-1]:6.2f}")
+        for phase in self.PHASES:
+            times = self.phase_times[phase]
+            if times:
+                lines.append(f"{phase:<9} {sum(times) / len(times):6.2f} ms")
+        enemy_counts = Counter(type(enemy).__name__ for enemy in session.enemies)
+        for name, count in sorted(enemy_counts.items()):
+            lines.append(f"{name:<15} {count:5}")
+        if session.budget.enemy_queue:
+            lines.append(f"{'queued enemies':<15} {len(session.budget.enemy_queue):5}")
+        lines.append(f"{'projectiles':<15} {len(session.projectiles):5}")
+        lines.append(f"{'damage numbers':<15} {len(session.damage_numbers):5}")
+        lines.append(f"{'pickups':<15} {len(session.health_pickups):5}")
+        return lines
+
+frame_profiler = FrameProfiler()
+
+# Отрисовка по грязным прямоугольникам: мир рисуется в чистый холст без VHS эффектов,
+# на экран переносятся только области, где что-то было нарисовано в этом или прошлом кадре
+class DirtyRectRenderer:
+    def __init__(self):
+        self.canvas = None
+        self.drawn_rects = []  # Где на холсте нарисовано в последнем кадре
+        self.shown_rects = []  # Области экрана, которые нужно восстановить в следующем кадре (включая оверлеи)
+        self.dirty_rects = None  # None — кадр выводится целиком
+        self.needs_full_frame = True
+
+    def invalidate(self):
+        # Экран перерисовал кто-то другой (отсчёт, пауза, меню)
+        self.needs_full_frame = True
+
+    def draw(self, session, alpha=1.0):
+        size = screen.get_size()
+        if self.canvas is None or self.canvas.get_size() != size:
+            self.canvas = pygame.Surface(size)
+            self.needs_full_frame = True
+        if self.needs_full_frame:
+            self.canvas.fill(BACKGROUND_COLOR)
+        else:
+            for rect in self.drawn_rects:
+                self.canvas.fill(BACKGROUND_COLOR, rect)
+        self.drawn_rects = session.draw(self.canvas, alpha)
+
+    def apply_vhs_effects(self):
+        # Переносит кадр на экран вместе с VHS эффектами; возвращает True, если сработал глитч
+        shifts = roll_chromatic_shifts()
+        if shifts is not None or self.needs_full_frame or len(self.shown_rects) + len(self.drawn_rects) > DIRTY_RECT_LIMIT:
+            screen.blit(self.canvas, (0, 0))
+            if shifts is not None:
+                shift_color_channels(screen, shifts)
+            apply_scanlines(screen)
+            self.dirty_rects = None
+        else:
+            # Холст копируется и затемняется полосами заново для каждой области,
+            # поэтому пересечения областей не затемняются дважды
+            scanline_surface = get_scanline_surface(screen.get_size())
+            self.dirty_rects = self.shown_rects + self.drawn_rects
+            for rect in self.dirty_rects:
+                screen.blit(self.canvas, rect, rect)
+                screen.blit(scanline_surface, rect, rect)
+        # После глитча сдвинутые каналы остались по всему экрану — следующий кадр тоже целиком
+        self.needs_full_frame = shifts is not None
+        return shifts is not None
+
+    def present(self, overlay_rect=None):
+        overlay_rects = [overlay_rect] if overlay_rect is not None else []
+        if self.dirty_rects is None:
+            present_display()
+        else:
+            present_display(self.dirty_rects + overlay_rects)
+        self.shown_rects = self.drawn_rects + overlay_rects
+
+dirty_renderer = DirtyRectRenderer()
+
+def show_game_over(session):
+    game_over_sound.play()
+    game_over_text = pygame.font.SysFont('Courier', 48).render(get_text('game_over'), True, TEXT_COLOR)
+    screen.blit(game_over_text, (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
+
+    # Применение VHS эффектов
+    apply_vhs_effects(screen)
+
+    present_display()
+    time.sleep(2)
+
+    # Конвертация опыта в $
+    settings['currency'] += session.earned_currency()
+    session.player.exp = 0
+    save_settings(settings)
+
+    # Если игрок погиб во время боя с боссом, останавливаем музыку босса и запускаем обычную
+    session.end_boss_fight()
+
 def main():
-    player = Player(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
-    enemies = []
-    damage_numbers = []
-    health_pickups = []
-    projectiles = []
-    wave = 1
-    wave_start_time = pygame.time.get_ticks()
+    start_wave = 1
+    if 'divinity' in settings['purchased_upgrades']:
+        start_wave = select_start_wave()
+    # Игровое время идёт шагами симуляции и отсчётом перед волной; пауза и меню его останавливают
+    start_ticks = pygame.time.get_ticks()
+    game_clock.simulate(start_ticks)
+    recorder = None
+    if record_path:
+        seed = random.randrange(2 ** 32)
+        random.seed(seed)
+        np.random.seed(seed)
+        recorder = ReplayRecorder(MouseInput(), seed, start_wave, start_ticks)
+    session = GameSession(start_wave, recorder)
+
+    try:
+        run_game_loop(session, recorder)
+    finally:
+        # Забег сохраняется при любом выходе, в том числе при закрытии окна
+        if recorder is not None:
+            recorder.save(record_path, session)
+        game_clock.use_real_time()
+
+def run_game_loop(session, recorder):
     paused = False
-    cursor_symbol = font.render('`', True, cursor_color)
     running = True
     esc_hold_start_time = None  # Время начала удержания клавиши Esc
     esc_hold_duration = 1000    # Время в миллисекундах для выхода в меню
     esc_pressed_during_pause = False  # Флаг, указывающий, что Esc был нажат во время паузы
-    boss_appearance_number = 1  # Счетчик появлений босса
     pause_initialized = False
-    
-    if 'divinity' in settings['purchased_upgrades']:
-        wave = select_start_wave()
+    accumulator = 0  # Реальное время, ещё не отработанное шагами симуляции
+    clock.tick()
 
     while running:
-        delta_time = clock.tick(60)
+        frame_time = min(clock.tick(RENDER_FPS_LIMIT), MAX_FRAME_TIME_MS)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    frame_profiler.toggle()
                 if event.key == pygame.K_ESCAPE:
                     if not paused:
                         paused = True
@@ -1891,214 +3628,83 @@ def main():
                         esc_pressed_during_pause = False
 
         if not paused:
-            screen.fill(BACKGROUND_COLOR)
-            mouse_x, mouse_y = pygame.mouse.get_pos()
-            player.move(mouse_x, mouse_y)
-
-            # Отображение персонажа игрока
-            draw_text(PLAYER_SYMBOL, font, PLAYER_COLOR, int(player.x), int(player.y))
-            screen.blit(cursor_symbol, (mouse_x - cursor_symbol.get_width() // 2, mouse_y - cursor_symbol.get_height() // 2))
-
-            if not enemies:
-                if player.hp > 0:
-                    wave_countdown()
-                    wave_start_time = pygame.time.get_ticks()
-                    # Проверяем, является ли текущая волна боссовой
-                    if wave % 10 == 5:
-                        in_boss_fight = True
-                        # Останавливаем основную музыку
-                        pygame.mixer.music.stop()
-                        # Воспроизводим музыку босса
-                        if not music_channel.get_busy():
-                            music_channel.play(boss_music, -1)
-                        # Спавним босса
-                        boss = Boss(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, boss_appearance_number, wave)
-                        enemies.append(boss)
-                        boss_appearance_number += 1
-                    else:
-                        in_boss_fight = False
-                        # Обычный спавн врагов
-                        enemies = spawn_enemies(wave * INITIAL_ENEMY_COUNT, wave)
-                    wave += 1
+            if not session.enemies:
+                if session.player.hp > 0:
+                    if session.wave % 10 == 5 and not boss_music.is_loaded:
+                        boss_music.load_in_background()  # Тема босса декодируется, пока идёт отсчёт
+                    # Отсчёт — это игровое время: снаряды и цифры урона прошлой волны за него истекают, как и в безголовом режиме.
+                    # Часы переводятся заранее, чтобы волна, собранная во время отсчёта, получила то же время, что при повторе
+                    game_clock.advance(WAVE_COUNTDOWN_MS)
+                    wave_countdown(session.prepare_next_wave)  # Следующая волна собирается в паузах между кадрами отсчёта
+                    if recorder is not None:
+                        recorder.record_wave_start()
+                    session.start_next_wave()
+                    # Время отсчёта не отрабатывается шагами симуляции
+                    clock.tick()
+                    accumulator = 0
+                    dirty_renderer.invalidate()
                 else:
-                    pygame.mixer.Sound.play(game_over_sound)
-                    game_over_text = pygame.font.SysFont('Courier', 48).render(get_text('game_over'), True, TEXT_COLOR)
-                    screen.blit(game_over_text, (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
-                    
-                    # Применение VHS эффектов
-                    chromatic_surface = chromatic_aberration(screen.copy())
-                    apply_scanlines(chromatic_surface)
-
-                    # Наложение VHS эффекта на экран
-                    chromatic_surface.blit(chromatic_surface, (0, 0))
-                    screen.blit(chromatic_surface, (0, 0))
-                    
-                    pygame.display.flip()
-                    time.sleep(2)
-                    
-                    # Конвертация опыта в $
-                    earned_dollars = player.exp / 15 * wave
-                    settings['currency'] += earned_dollars
-                    player.exp = 0
-                    save_settings(settings)
-                    
+                    screen.fill(BACKGROUND_COLOR)
+                    session.draw(screen)
+                    if recorder is not None:
+                        recorder.finish(session)
+                    show_game_over(session)
                     return  # Возврат в главное меню
 
-            # Обновление и отображение врагов и снарядов
-            for enemy in enemies:
-                enemy.move_towards_player(player.x, player.y, enemies)
-                if isinstance(enemy, Boss):
-                    enemy.update(delta_time, player.x, player.y, projectiles, enemies)
-                    symbol = enemy.symbol
-                    # Проверка состояния босса для отображения цвета
-                    if enemy.is_red:
-                        color = ENEMY_COLOR  # Красный цвет
-                    else:
-                        color = enemy.color
-                    draw_text(symbol, boss_font, color, enemy.x, enemy.y)
-                elif isinstance(enemy, RusherEnemy):
-                    enemy.update(player.x, player.y, delta_time)
-                    draw_text(enemy.symbol, font, enemy.color, int(enemy.x), int(enemy.y))
-                else:
-                    enemy.update(delta_time)
-                    if not enemy.is_dead:
-                        if isinstance(enemy, SuicideEnemy):
-                            symbol = enemy.symbol
-                        else:
-                            if enemy.is_shooter:
-                                projectile = enemy.shoot(player.x, player.y)
-                                if projectile:
-                                    projectiles.append(projectile)
-                                symbol = SHOOTER_SYMBOL
-                            else:
-                                symbol = ENEMY_SYMBOL
-                        draw_text(symbol, font, enemy.color, enemy.x, enemy.y)
-                        
-            # Отображение полоски здоровья босса
-            for enemy in enemies:
-                if isinstance(enemy, Boss):
-                    # Размеры полоски HP
-                    bar_width = SCREEN_WIDTH * 0.6
-                    bar_height = 18
-                    bar_x = (SCREEN_WIDTH - bar_width) / 2
-                    bar_y = SCREEN_HEIGHT - bar_height - 30  # Отступ от нижнего края
-
-                    # Рисуем белую рамку
-                    pygame.draw.rect(screen, (255, 255, 255), (bar_x, bar_y, bar_width, bar_height), 1)  # Толщина рамки 1 пиксель
-
-                    # Вычисляем ширину заполненной части
-                    filled_width = (bar_width - 2) * (enemy.hp / enemy.max_hp)  # Вычитаем 2 пикселя для учёта рамки
-                    if filled_width < 0:
-                        filled_width = 0  # Чтобы не было отрицательной ширины
-
-                    # Рисуем заполненную часть
-                    pygame.draw.rect(screen, (162, 68, 43), (bar_x + 1, bar_y + 1, filled_width, bar_height - 2))
-
-                    # Отображаем текст "Boss" над полоской HP
-                    boss_text = font.render(get_text('boss'), True, (255, 255, 255))
-                    text_rect = boss_text.get_rect(center=(SCREEN_WIDTH / 2, bar_y - 10))
-                    screen.blit(boss_text, text_rect)
-                    break  # Босс только один
-                    
-            for enemy in enemies[:]:
-                if enemy.is_dead and isinstance(enemy, SuicideEnemy):
-                    if enemy.explode:
-                        # Воспроизводим звук взрыва или выстрела
-                        if not shooter_fire_channel.get_busy():
-                            shooter_fire_channel.play(shooter_fire_sound)
-                        
-                        # Враг взрывается и выпускает снаряды
-                        num_projectiles = min(6 + enemy.wave, 12)
-                        angle_between_projectiles = 360 / num_projectiles
-                        for i in range(num_projectiles):
-                            angle = math.radians(i * angle_between_projectiles)
-                            dx = math.cos(angle)
-                            dy = math.sin(angle)
-                            projectile = Projectile(enemy.x, enemy.y, dx, dy, enemy.damage)
-                            projectiles.append(projectile)
-                    enemies.remove(enemy)  # Удаляем врага из списка
-
-            for projectile in projectiles[:]:
-                if not projectile.update(player.x, player.y):
-                    projectiles.remove(projectile)
-                else:
-                    projectile.draw(screen)
-
-            # Обработка столкновений и проверка на окончание игры
-            game_over = handle_collisions(player, enemies, damage_numbers, wave, wave_start_time, projectiles, health_pickups)
+            frame_profiler.begin_frame()
+            # Фиксированный шаг: столько шагов симуляции, сколько накопилось реального времени
+            accumulator += frame_time
+            game_over = False
+            while accumulator >= SIMULATION_STEP_MS and not game_over:
+                accumulator -= SIMULATION_STEP_MS
+                game_clock.advance(SIMULATION_STEP_MS)
+                level = session.player.level
+                session.update_entities(SIMULATION_STEP_MS)
+                frame_profiler.step_lap('update')
+                game_over = session.resolve_collisions()
+                frame_profiler.step_lap('collision')
+                if session.player.level != level:
+                    # Меню улучшений тоже останавливает время — его не догоняем
+                    clock.tick()
+                    accumulator = 0
+                    dirty_renderer.invalidate()
+            frame_profiler.end_steps()
+
+            if USE_DIRTY_RECTS:
+                dirty_renderer.draw(session, accumulator / SIMULATION_STEP_MS)
+            else:
+                screen.fill(BACKGROUND_COLOR)
+                session.draw(screen, accumulator / SIMULATION_STEP_MS)
+            frame_profiler.lap('render')
             if game_over:
-                pygame.mixer.Sound.play(game_over_sound)
-                game_over_text = pygame.font.SysFont('Courier', 48).render(get_text('game_over'), True, TEXT_COLOR)
-                screen.blit(game_over_text, (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
-                
-                # Применение VHS эффектов
-                chromatic_surface = chromatic_aberration(screen.copy())
-                apply_scanlines(chromatic_surface)
-
-                # Наложение VHS эффекта на экран
-                chromatic_surface.blit(chromatic_surface, (0, 0))
-                screen.blit(chromatic_surface, (0, 0))
-                
-                pygame.display.flip()
-                time.sleep(2)
-                
-                # Конвертация опыта в $
-                earned_dollars = player.exp / 15 * wave
-                settings['currency'] += earned_dollars
-                player.exp = 0
-                save_settings(settings)
-
-                # Если игрок погиб во время боя с боссом, останавливаем музыку босса и запускаем обычную
-                if in_boss_fight:
-                    in_boss_fight = False
-                    boss_music.stop()
-                    pygame.mixer.music.play(-1, 0.0)
-
+                if USE_DIRTY_RECTS:
+                    screen.blit(dirty_renderer.canvas, (0, 0))
+                    dirty_renderer.invalidate()
+                if recorder is not None:
+                    recorder.finish(session)
+                show_game_over(session)
                 return  # Возврат в главное меню
 
-            # Обновление и отображение чисел урона
-            for dmg_num in damage_numbers[:]:
-                if not dmg_num.update():
-                    damage_numbers.remove(dmg_num)
-                else:
-                    dmg_num.draw(screen)
-
-            # Обновление и отображение аптечек здоровья
-            for health_pickup in health_pickups[:]:
-                health_pickup.draw(screen)
-                if health_pickup.is_colliding(player):
-                    healed_amount = player.health_pickup_heal_amount
-                    player.heal(healed_amount)
-                    health_pickups.remove(health_pickup)
-                    pygame.mixer.Sound.play(health_pickup_sound)
-                    damage_numbers.append(DamageNumber(player.x, player.y, f"+{healed_amount} {get_text('hp')}", (0, 255, 0)))
-
-            # Отображение статистики игрока (уровень, здоровье и опыт)
-            stats_text = f"{get_text('level')}: {player.level}  {get_text('hp')}: {player.hp:.1f}/{player.max_hp:.1f}  {get_text('defense')}: {player.defense_upgrade_count * 0.2:.1f}  {get_text('exp')}: {player.exp:.1f}/{player.exp_to_level_up}"
-            draw_text(stats_text, font, TEXT_COLOR, 10, 10)
-
-            # Удаление мертвых врагов
-            enemies = [enemy for enemy in enemies if not enemy.is_dead]
-            
-            if not enemies:
-                if in_boss_fight:
-                    in_boss_fight = False
-                    # Останавливаем музыку босса
-                    boss_music.stop()
-                    # Запускаем основную музыку
-                    pygame.mixer.music.play(-1, 0.0)
-
             # Применение VHS эффектов
-            chromatic_surface = chromatic_aberration(screen.copy())
-            apply_scanlines(chromatic_surface)
+            if USE_DIRTY_RECTS:
+                dirty_renderer.apply_vhs_effects()
+            else:
+                apply_vhs_effects(screen)
+            frame_profiler.lap('vhs')
 
-            # Наложение VHS эффекта на экран
-            chromatic_surface.blit(chromatic_surface, (0, 0))
-            screen.blit(chromatic_surface, (0, 0))
+            # Оверлей профайлера рисуется поверх VHS прохода и в него не попадает
+            overlay_rect = frame_profiler.draw(screen, session)
+            frame_profiler.lap('overlay')
 
-            pygame.display.flip()
+            if USE_DIRTY_RECTS:
+                dirty_renderer.present(overlay_rect)
+            else:
+                present_display()
+            frame_profiler.lap('flip')
+            frame_profiler.end_frame()
         else:
             if not pause_initialized:
+                dirty_renderer.invalidate()  # Пауза рисует поверх кадра
                 pause_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
                 # Отображаем паузу
                 screen.blit(pause_overlay, (0, 0))
@@ -2113,27 +3719,270 @@ def main():
                 hint_text_surface.set_alpha(200)
                 screen.blit(hint_text_surface, 
                             (SCREEN_WIDTH // 2 - hint_text_surface.get_width() // 2, SCREEN_HEIGHT - 100))
-                chromatic_surface = chromatic_aberration(screen.copy())
-                apply_scanlines(chromatic_surface)
-                chromatic_surface.blit(chromatic_surface, (0, 0))
-                screen.blit(chromatic_surface, (0, 0))
+                apply_vhs_effects(screen)
                 pause_initialized = True
 
-            pygame.display.flip()
+            present_display()
+            clock.tick(60)  # Кадр паузы статичен — перерисовывать его с частотой RENDER_FPS_LIMIT незачем
 
             # Проверка удержания клавиши Esc для выхода в меню
             if esc_hold_start_time is not None:
                 hold_time = pygame.time.get_ticks() - esc_hold_start_time
                 if hold_time >= esc_hold_duration:
-                    if in_boss_fight:
-                        in_boss_fight = False
-                        boss_music.stop()
-                        pygame.mixer.music.play(-1, 0.0)
+                    session.end_boss_fight()
                     return  # Возвращаемся из функции main(), что приведет к возврату в главное меню
 
     pygame.quit()
 
+# Безголовая детерминированная симуляция: фиксированный тик, сид и скриптовый ввод, без окна и ожидания
+def run_headless(waves=10, seed=0, tick_rate=SIMULATION_TICK_RATE, start_wave=1, input_source=None, max_ticks=None):
+    random.seed(seed)
+    np.random.seed(seed)
+    game_clock.simulate(0)
+    tick_ms = 1000 / tick_rate
+    if max_ticks is None:
+        max_ticks = tick_rate * 60 * 30  # Не больше 30 минут игрового времени
+    session = GameSession(start_wave, input_source or ScriptedInput())
+    last_wave = start_wave + waves
+    ticks = 0
+    died = False
+    started = time.perf_counter()
+
+    while ticks < max_ticks:
+        if not session.enemies:
+            if session.wave >= last_wave:
+                break  # Все запрошенные волны пройдены
+            game_clock.advance(WAVE_COUNTDOWN_MS)  # Отсчёт перед волной
+            session.start_next_wave()
+        game_clock.advance(tick_ms)
+        ticks += 1
+        if session.update(tick_ms):
+            died = True
+            break
+
+    wall_time = time.perf_counter() - started
+    game_clock.use_real_time()
+    session.end_boss_fight()
+    player = session.player
+    return {
+        'seed': seed,
+        'tick_rate': tick_rate,
+        'start_wave': start_wave,
+        'waves_requested': waves,
+        'wave_reached': session.wave - 1,
+        'died': died,
+        'timed_out': ticks >= max_ticks,
+        'ticks': ticks,
+        'game_time_ms': round(ticks * tick_ms),
+        'wall_time_s': round(wall_time, 3),
+        'ticks_per_second': round(ticks / wall_time, 1) if wall_time > 0 else None,
+        'level': player.level,
+        'kills': session.kills,
+        'damage_taken': round(player.total_damage_taken, 2),
+        'exp_earned': round(player.total_exp, 2),
+        'currency_earned': round(session.earned_currency(), 2),
+        'budget': session.budget.summary()
+    }
+
+# Воспроизведение записанного забега: на экране со скоростью игры или без окна так быстро, как возможно
+def run_replay(path, on_screen=False):
+    global USE_SWARM_ENGINE, USE_AI_LOD
+    header, records = load_replay(path)
+    saved_state = (list(settings['purchased_upgrades']), settings['render_resolution'], USE_SWARM_ENGINE, USE_AI_LOD,
+                   settings_writer.enabled)
+    # Настройки записи действуют только на время просмотра и не должны попасть в settings.cfg
+    settings_writer.enabled = False
+    settings['purchased_upgrades'] = list(header['purchased_upgrades'])
+    USE_SWARM_ENGINE = header['swarm_engine']
+    USE_AI_LOD = header.get('ai_lod', False)
+    if [SCREEN_WIDTH, SCREEN_HEIGHT] != header['screen_size']:
+        # Границы спавна зависят от размера поля — рисуем в разрешении записи
+        settings['render_resolution'] = tuple(header['screen_size'])
+        apply_display_settings()
+
+    random.seed(header['seed'])
+    np.random.seed(header['seed'])
+    game_clock.simulate(header['start_ticks'])
+    tick_ms = 1000 / header['tick_rate']
+    replay_input = ReplayInput(records)
+    session = GameSession(header['start_wave'], replay_input)
+    ticks = 0
+    stopped = False
+    started = time.perf_counter()
+
+    try:
+        for tag, value in replay_input.records:
+            if tag == REPLAY_WAVE_START:
+                game_clock.advance(header['countdown_ms'])
+                session.start_next_wave()
+                continue
+            if tag != REPLAY_TICK_MOVE:
+                raise ValueError('replay desynced: unexpected upgrade choice')
+            replay_input.pos = value
+            game_clock.advance(tick_ms)
+            ticks += 1
+            session.update(tick_ms)
+            if on_screen:
+                screen.fill(BACKGROUND_COLOR)
+                session.draw(screen)
+                apply_vhs_effects(screen)
+                present_display()
+                clock.tick(header['tick_rate'])
+                if any(event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE)
+                       for event in pygame.event.get()):
+                    stopped = True
+                    break
+    finally:
+        wall_time = time.perf_counter() - started
+        game_clock.use_real_time()
+        session.end_boss_fight()
+        settings['purchased_upgrades'], render_resolution, USE_SWARM_ENGINE, USE_AI_LOD, writer_enabled = saved_state
+        if settings['render_resolution'] != render_resolution:
+            settings['render_resolution'] = render_resolution
+            apply_display_settings()
+        settings_writer.enabled = writer_enabled
+
+    return {
+        'replay': path,
+        'seed': header['seed'],
+        'start_wave': header['start_wave'],
+        'wave_reached': session.wave - 1,
+        'ticks': ticks,
+        'ticks_recorded': header['ticks'],
+        'stopped': stopped,
+        'checksum_match': None if stopped else session_checksum(session) == header['checksum'],
+        'wall_time_s': round(wall_time, 3),
+        'ticks_per_second': round(ticks / wall_time, 1) if wall_time > 0 else None,
+        'kills': session.kills
+    }
+
+# Пакетная симуляция: много безголовых забегов бота с разными сидами в пуле процессов
+# Процессы запускаются через spawn: каждый воркер поднимает свой pygame с dummy-драйверами
+def init_batch_worker(purchased_upgrades, ai_lod=False, swarm_engine=False):
+    global USE_AI_LOD, USE_SWARM_ENGINE
+    settings_writer.enabled = False
+    USE_AI_LOD = ai_lod
+    USE_SWARM_ENGINE = swarm_engine
+    bootstrap(headless=True)
+    settings['purchased_upgrades'] = list(purchased_upgrades)
+
+def run_batch_job(job):
+    seed, waves, tick_rate, start_wave, max_ticks = job
+    return run_headless(waves, seed, tick_rate, start_wave, max_ticks=max_ticks)
+
+def describe_values(values):
+    ordered = sorted(values)
+    return {
+        'mean': round(statistics.fmean(ordered), 3),
+        'min': ordered[0],
+        'p10': ordered[int(0.1 * (len(ordered) - 1))],
+        'median': statistics.median(ordered),
+        'p90': ordered[int(0.9 * (len(ordered) - 1))],
+        'max': ordered[-1]
+    }
+
+def run_batch(runs, workers=None, seed=0, waves=10, tick_rate=SIMULATION_TICK_RATE, start_wave=1, max_ticks=None,
+              purchased_upgrades=None):
+    workers = workers or os.cpu_count() or 1
+    if purchased_upgrades is None:
+        # Родительский процесс не проходит bootstrap(): купленные улучшения читаем сами и раздаём воркерам явно
+        init_settings()
+        purchased_upgrades = list(settings['purchased_upgrades'])
+    jobs = [(seed + index, waves, tick_rate, start_wave, max_ticks) for index in range(runs)]
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=init_batch_worker, initargs=(purchased_upgrades, USE_AI_LOD, USE_SWARM_ENGINE)) as pool:
+        # Забеги сильно различаются по длине, поэтому раздаём их по одному, а не пачками
+        results = list(pool.imap_unordered(run_batch_job, jobs))
+        # Воркеры завершаются сами; terminate() при выходе из with может повиснуть на процессе с pygame
+        pool.close()
+        pool.join()
+    wall_time = time.perf_counter() - started
+    results.sort(key=lambda result: result['seed'])
+
+    aggregate = {key: describe_values([result[key] for result in results])
+                 for key in ('wave_reached', 'ticks', 'damage_taken', 'exp_earned', 'currency_earned', 'ticks_per_second')}
+    aggregate['death_rate'] = round(sum(result['died'] for result in results) / runs, 3)
+    return {
+        'runs': runs,
+        'workers': workers,
+        'first_seed': seed,
+        'waves_requested': waves,
+        'start_wave': start_wave,
+        'tick_rate': tick_rate,
+        'ai_lod': USE_AI_LOD,
+        'swarm_engine': USE_SWARM_ENGINE,
+        'purchased_upgrades': purchased_upgrades,
+        'wall_time_s': round(wall_time, 3),
+        'runs_per_second': round(runs / wall_time, 2),
+        'aggregate': aggregate,
+        'results': results
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Ākēdo')
+    parser.add_argument('--headless', action='store_true', help='run the game logic without a window, as fast as possible')
+    parser.add_argument('--waves', type=int, default=10, help='number of waves to simulate (headless)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (headless)')
+    parser.add_argument('--tick-rate', type=int, default=SIMULATION_TICK_RATE, help='simulation ticks per game second (headless)')
+    parser.add_argument('--start-wave', type=int, default=1, help='wave to start from (headless)')
+    parser.add_argument('--max-ticks', type=int, default=None, help='stop the simulation after this many ticks (headless)')
+    parser.add_argument('--output', help='write the headless run summary to this JSON file')
+    parser.add_argument('--batch', type=int, metavar='RUNS', help='simulate this many headless runs with seeds --seed, --seed+1, ... across a process pool')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for --batch (default: all cores)')
+    parser.add_argument('--upgrades', default=None, help='comma-separated shop upgrades to simulate with instead of the purchased ones (headless)')
+    parser.add_argument('--dirty-rects', action='store_true', help='redraw and present only the screen regions that changed')
+    parser.add_argument('--ai-lod', action='store_true', help='steer distant enemies in round-robin slices instead of every tick')
+    parser.add_argument('--swarm-engine', action='store_true', help='update plain and shooter enemies in one NumPy batch (SwarmEngine)')
+    parser.add_argument('--record', metavar='FILE', help='record every run started from the menu to this replay file (overwritten per run)')
+    parser.add_argument('--replay', metavar='FILE', help='play back a recorded run; with --headless, as fast as possible')
+    parser.add_argument('--startup-report', action='store_true', help='print how long each startup stage took, up to the first menu frame')
+    args = parser.parse_args(argv)
+    if args.upgrades:
+        unknown = set(args.upgrades.split(',')) - {upgrade['id'] for upgrade in shop_upgrades} - {''}
+        if unknown:
+            parser.error(f"unknown upgrades: {', '.join(sorted(unknown))}")
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
+    report_startup = args.startup_report
+    USE_DIRTY_RECTS = args.dirty_rects
+    USE_AI_LOD = args.ai_lod
+    USE_SWARM_ENGINE = args.swarm_engine
+    record_path = args.record
+    purchased_upgrades = [upgrade for upgrade in args.upgrades.split(',') if upgrade] if args.upgrades is not None else None
+    if args.batch:
+        result = run_batch(args.batch, args.workers, args.seed, args.waves, args.tick_rate, args.start_wave, args.max_ticks,
+                           purchased_upgrades)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(result, output_file, indent=2)
+        print(json.dumps({key: value for key, value in result.items() if key != 'results'}, indent=2))
+        sys.exit()
+    bootstrap(args.headless)
+    if args.replay:
+        result = run_replay(args.replay, on_screen=not args.headless)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(result, output_file, indent=2)
+        else:
+            print(json.dumps(result, indent=2))
+        pygame.quit()
+        sys.exit()
+    if args.headless:
+        if purchased_upgrades is not None:
+            settings_writer.enabled = False  # Симуляция с другими улучшениями не должна попасть в settings.cfg
+            settings['purchased_upgrades'] = purchased_upgrades
+        result = run_headless(args.waves, args.seed, args.tick_rate, args.start_wave, max_ticks=args.max_ticks)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(result, output_file, indent=2)
+        else:
+            print(json.dumps(result, indent=2))
+        pygame.quit()
+        sys.exit()
+
     while True:
         main_menu()
         main()
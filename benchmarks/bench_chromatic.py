@@ -0,0 +1,97 @@
+# Микробенчмарк VHS прохода: старая хроматическая аберрация (копия экрана, np.roll, make_surface)
+# против сдвига каналов на месте в буфере экрана
+# Запуск: python benchmarks/bench_chromatic.py [--repeat 50] [--sizes 1280x720,1600x900,1920x1080,2560x1440]
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame
+
+import Akedo
+
+# Бенчмарк не зависит от улучшений из локального settings.cfg и ничего в него не пишет
+Akedo.settings_writer.enabled = False
+Akedo.bootstrap()
+Akedo.settings['purchased_upgrades'] = []
+
+SHIFTS = ((1, -1), (-1, 0), (0, 1))
+
+
+def legacy_vhs(screen, shifts):
+    # Прежний конвейер из вызывающего кода: screen.copy(), три копии каналов, шесть np.roll, dstack,
+    # make_surface, scanlines и двойной blit обратно
+    surface = screen.copy()
+    if shifts is not None:
+        arr = pygame.surfarray.pixels3d(surface)
+        r_arr = arr[:, :, 0].copy()
+        g_arr = arr[:, :, 1].copy()
+        b_arr = arr[:, :, 2].copy()
+        del arr
+        r_arr = np.roll(np.roll(r_arr, shifts[0][0], axis=0), shifts[0][1], axis=1)
+        g_arr = np.roll(np.roll(g_arr, shifts[1][0], axis=0), shifts[1][1], axis=1)
+        b_arr = np.roll(np.roll(b_arr, shifts[2][0], axis=0), shifts[2][1], axis=1)
+        surface = pygame.surfarray.make_surface(np.dstack([r_arr, g_arr, b_arr]))
+    Akedo.apply_scanlines(surface)
+    surface.blit(surface, (0, 0))
+    screen.blit(surface, (0, 0))
+
+
+def inplace_vhs(screen, shifts):
+    if shifts is not None:
+        Akedo.shift_color_channels(screen, shifts)
+    Akedo.apply_scanlines(screen)
+
+
+def make_frame(size, seed):
+    # Случайные глифы на чёрном фоне — похоже на игровой кадр
+    random.seed(seed)
+    surface = pygame.Surface(size)
+    surface.fill(Akedo.BACKGROUND_COLOR)
+    for _ in range(300):
+        color = random.choice([Akedo.TEXT_COLOR, Akedo.ENEMY_COLOR, Akedo.PLAYER_COLOR, Akedo.PROJECTILE_COLOR])
+        glyph = Akedo.get_glyph(random.choice('MS@*+oRB'), Akedo.font, color)
+        surface.blit(glyph, (random.randrange(size[0]), random.randrange(size[1])))
+    return surface
+
+
+def time_pass(function, frame, shifts, repeat):
+    timings = []
+    for _ in range(repeat):
+        screen = frame.copy()
+        start = time.perf_counter()
+        function(screen, shifts)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VHS pass cost: legacy chromatic aberration vs in-place channel shift.')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--sizes', default='1280x720,1600x900,1920x1080,2560x1440')
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'effect':>7} {'legacy ms':>10} {'in-place ms':>12} {'speedup':>8}  identical")
+    for size in args.sizes.split(','):
+        size = tuple(map(int, size.split('x')))
+        frame = make_frame(size, 1)
+        for label, shifts in (('on', SHIFTS), ('off', None)):
+            legacy_ms = time_pass(legacy_vhs, frame, shifts, args.repeat)
+            inplace_ms = time_pass(inplace_vhs, frame, shifts, args.repeat)
+            # Результат должен совпадать попиксельно
+            legacy_screen = frame.copy()
+            legacy_vhs(legacy_screen, shifts)
+            inplace_screen = frame.copy()
+            inplace_vhs(inplace_screen, shifts)
+            identical = np.array_equal(pygame.surfarray.array3d(legacy_screen), pygame.surfarray.array3d(inplace_screen))
+            print(f"{size[0]}x{size[1]:<5} {label:>7} {legacy_ms:>10.3f} {inplace_ms:>12.3f} {legacy_ms / inplace_ms:>7.1f}x  {identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# Бенчмарк памяти сущностей через tracemalloc: байт на экземпляр каждого типа — со __slots__ и в прежней
+# раскладке со словарём экземпляра — и пик памяти стресс-волны из 1000 врагов и 5000 снарядов
+# Запуск: python benchmarks/bench_memory.py [--count 2000] [--enemies 1000] [--projectiles 5000] [--frames 60] [--output memory.json]
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import Akedo
+
+# Бенчмарк не зависит от улучшений из локального settings.cfg и ничего в него не пишет
+Akedo.settings_writer.enabled = False
+Akedo.bootstrap(headless=True)
+Akedo.settings['purchased_upgrades'] = []
+
+FRAME_MS = 1000 / 60
+
+
+def random_position():
+    return random.randint(0, Akedo.SCREEN_WIDTH), random.randint(0, Akedo.SCREEN_HEIGHT)
+
+
+# Конструкторы сущностей по имени типа
+ENTITY_FACTORIES = {
+    'Player': lambda: Akedo.Player(*random_position()),
+    'Enemy': lambda: Akedo.Enemy(*random_position(), is_shooter=random.random() < 0.31, wave=24),
+    'SuicideEnemy': lambda: Akedo.SuicideEnemy(*random_position(), wave=24),
+    'RusherEnemy': lambda: Akedo.RusherEnemy(*random_position(), wave=24),
+    'Boss': lambda: Akedo.Boss(*random_position(), wave=25),
+    'HealthPickup': lambda: Akedo.HealthPickup(*random_position()),
+    'Projectile': lambda: Akedo.Projectile(*random_position(), 1.0, 0.0, 1)
+}
+
+# Поля, которые до __slots__ каждый экземпляр хранил сам, а теперь хранит класс
+FORMER_INSTANCE_FIELDS = {
+    'SuicideEnemy': ('symbol', 'shake_duration'),
+    'RusherEnemy': ('symbol', 'rush_speed', 'rush_inertia', 'shake_duration'),
+    'Boss': ('symbol', 'attack_patterns', 'attack_cooldown', 'shake_duration', 'phases', 'rush_speed', 'rush_inertia',
+             'rush_duration', 'rush_rest_min', 'rush_rest_max', 'whip_emit_interval'),
+    'Projectile': ('lifetime', 'speed')
+}
+
+
+def fresh_copy(value):
+    # Прежние поля-таблицы каждый экземпляр собирал заново из списков
+    if isinstance(value, (tuple, list)):
+        return [fresh_copy(item) for item in value]
+    if isinstance(value, dict):
+        return {key: fresh_copy(item) for key, item in value.items()}
+    return value
+
+
+def dict_backed_factory(name, factory):
+    # Прежняя раскладка: те же значения полей в словаре экземпляра класса без __slots__.
+    # Подкласс сущности тут не подходит — поля родителя всё равно легли бы в слоты. Объект со слотами
+    # создаётся ради значений полей (и записи в куче таймеров), а его собственный размер measure_entity вычитает
+    replica_class = type(name + 'Dict', (), {})
+
+    def build():
+        entity = factory()
+        replica = replica_class()
+        for cls in reversed(type(entity).__mro__):
+            for field in cls.__dict__.get('__slots__', ()):
+                if hasattr(entity, field):
+                    setattr(replica, field, getattr(entity, field))
+        for field in FORMER_INSTANCE_FIELDS.get(name, ()):
+            setattr(replica, field, fresh_copy(getattr(entity, field)))
+        return entity, replica
+    return build
+
+
+def measure_entity(factory, count, dict_backed=False):
+    # Прирост памяти, который остаётся после создания count экземпляров, делённый на count
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    overhead = sys.getsizeof(instances)
+    if dict_backed:
+        # Пары (сущность, копия) и сами объекты со слотами в прежней раскладке не существовали
+        overhead += sum(sys.getsizeof(pair) + sys.getsizeof(pair[0]) for pair in instances)
+    del instances
+    return (after - before - overhead) / count
+
+
+def measure_stress_wave(enemies, projectiles, frames):
+    # Пик памяти: спавн волны, залп снарядов и несколько шагов симуляции
+    gc.collect()
+    tracemalloc.start()
+    session = Akedo.GameSession(24, Akedo.ScriptedInput())
+    session.player.max_hp = session.player.hp = 1e9
+    # Вся волна должна быть живой одновременно, поэтому лимиты EntityBudget поднимаются до её размера
+    session.budget.limits.update(enemies=enemies, projectiles=projectiles)
+    session.enemies = Akedo.spawn_enemies(enemies, 24, session.swarm)
+    for _ in range(projectiles):
+        x, y = random_position()
+        session.projectiles.append(Akedo.Projectile(x, y, 1.0, 0.0, 1))
+    spawned = tracemalloc.get_traced_memory()[0]
+    for _ in range(frames):
+        Akedo.game_clock.advance(FRAME_MS)
+        session.update_entities(FRAME_MS)
+        session.resolve_collisions()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'after_spawn_bytes': spawned, 'current_bytes': current, 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory per entity type and peak memory of a stress wave (tracemalloc).')
+    parser.add_argument('--count', type=int, default=2000, help='instances per entity type')
+    parser.add_argument('--enemies', type=int, default=1000)
+    parser.add_argument('--projectiles', type=int, default=5000)
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    Akedo.game_clock.simulate(0)
+
+    per_entity = {}
+    per_entity_dict = {}
+    print(f"{'entity':<14} {'dict':>9} {'slots':>9} {'saved':>7}")
+    for name, factory in ENTITY_FACTORIES.items():
+        per_entity_dict[name] = round(measure_entity(dict_backed_factory(name, factory), args.count, dict_backed=True), 1)
+        per_entity[name] = round(measure_entity(factory, args.count), 1)
+        saved = 1 - per_entity[name] / per_entity_dict[name]
+        print(f"{name:<14} {per_entity_dict[name]:>9.1f} {per_entity[name]:>9.1f} {saved:>7.0%}")
+    Akedo.timers.clear()  # Таймеры созданных выше врагов держат их в куче
+
+    stress = measure_stress_wave(args.enemies, args.projectiles, args.frames)
+    print(f"stress wave ({args.enemies} enemies, {args.projectiles} projectiles): "
+          f"after spawn {stress['after_spawn_bytes'] / 1024:.1f} KiB, peak {stress['peak_bytes'] / 1024:.1f} KiB")
+    Akedo.game_clock.use_real_time()
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'python': sys.version.split()[0], 'bytes_per_entity': per_entity,
+                       'bytes_per_entity_dict_backed': per_entity_dict, 'stress_wave': stress}, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Бенчмарк разведения врагов: полный перебор списка против пространственной сетки
+# Запуск: python benchmarks/bench_separation.py [--frames 120] [--counts 24,72,150,300,600]
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Akedo
+
+
+def make_enemies(count, seed):
+    random.seed(seed)
+    enemies = []
+    for _ in range(count):
+        x = random.randint(0, Akedo.SCREEN_WIDTH)
+        y = random.randint(0, Akedo.SCREEN_HEIGHT)
+        enemies.append(Akedo.Enemy(x, y, random.random() < 0.31, 24))
+    return enemies
+
+
+def run_frames(enemies, frames, use_grid, seed):
+    # Игрок стоит в центре, враги стягиваются к нему — так соседей становится всё больше
+    random.seed(seed)
+    player_x, player_y = Akedo.SCREEN_WIDTH // 2, Akedo.SCREEN_HEIGHT // 2
+    enemy_grid = Akedo.SpatialHash()
+    frame_times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        if use_grid:
+            enemy_grid.rebuild(enemies)
+            for enemy in enemies:
+                enemy.move_towards_player(player_x, player_y, enemy_grid)
+                enemy_grid.update(enemy)
+        else:
+            for enemy in enemies:
+                enemy.move_towards_player(player_x, player_y, enemies)
+        frame_times.append(time.perf_counter() - start)
+    return frame_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Enemy separation frame cost: list scan vs spatial hash.')
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--counts', default='24,72,150,300,600')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'enemies':>8} {'list ms':>10} {'grid ms':>10} {'speedup':>8}  match")
+    for count in map(int, args.counts.split(',')):
+        list_enemies = make_enemies(count, args.seed)
+        grid_enemies = make_enemies(count, args.seed)
+        list_times = run_frames(list_enemies, args.frames, False, args.seed)
+        grid_times = run_frames(grid_enemies, args.frames, True, args.seed)
+        # Поведение должно совпадать с исходным до бита
+        match = all(a.x == b.x and a.y == b.y for a, b in zip(list_enemies, grid_enemies))
+        list_ms = sum(list_times) / len(list_times) * 1000
+        grid_ms = sum(grid_times) / len(grid_times) * 1000
+        print(f"{count:>8} {list_ms:>10.3f} {grid_ms:>10.3f} {list_ms / grid_ms:>7.1f}x  {match}")
+
+
+if __name__ == '__main__':
+    main()
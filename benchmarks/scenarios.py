@@ -0,0 +1,231 @@
+# Набор сценарных бенчмарков стоимости кадра
+# Каждый сценарий идёт фиксированное число кадров с фиксированным сидом и игровыми часами,
+# время кадра делится на фазы update / collision / render / post (VHS + flip)
+# Запуск: python benchmarks/scenarios.py [--frames 600] [--seed 1] [--scenarios wave24_spawn,stress_300] [--dirty-rects] [--ai-lod] [--swarm-engine] [--output results.json]
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame
+
+import Akedo
+
+# Бенчмарк не зависит от улучшений из локального settings.cfg и ничего в него не пишет
+Akedo.settings_writer.enabled = False
+Akedo.bootstrap()
+Akedo.settings['purchased_upgrades'] = []
+
+PHASES = ('update', 'collision', 'render', 'post')
+FRAME_MS = 1000 / 60
+
+
+# Курсор кружит вокруг центра экрана — нагрузка не зависит от качества бота
+class OrbitInput:
+    def __init__(self, radius=250, period_frames=360):
+        self.radius = radius
+        self.period_frames = period_frames
+        self.frame = 0
+
+    def get_pos(self, session):
+        self.frame += 1
+        angle = 2 * math.pi * self.frame / self.period_frames
+        return (int(Akedo.SCREEN_WIDTH / 2 + math.cos(angle) * self.radius),
+                int(Akedo.SCREEN_HEIGHT / 2 + math.sin(angle) * self.radius * 0.6))
+
+    def choose_upgrade(self, player):
+        Akedo.apply_upgrade(player, 'damage')
+
+
+def new_session(wave):
+    session = Akedo.GameSession(wave, OrbitInput())
+    # Игрок не должен погибнуть посреди замера
+    session.player.max_hp = session.player.hp = 1e9
+    return session
+
+
+def setup_wave24_spawn():
+    # Спавн волны 24 (72 врага) происходит внутри первого замеряемого кадра
+    session = new_session(24)
+    return session, session.start_next_wave
+
+
+def setup_stress_300():
+    session = new_session(24)
+    session.enemies = Akedo.spawn_enemies(300, 24, session.swarm)
+    return session, None
+
+
+def setup_stress_300_swarm():
+    # Тот же стресс-тест, но обычные враги и стрелки обновляются пакетно через SwarmEngine
+    swarm_engine = Akedo.USE_SWARM_ENGINE
+    Akedo.USE_SWARM_ENGINE = True
+    try:
+        return setup_stress_300()
+    finally:
+        Akedo.USE_SWARM_ENGINE = swarm_engine
+
+
+def make_boss_setup(pattern):
+    def setup():
+        session = new_session(5)
+        session.start_next_wave()
+        boss = session.enemies[0]
+        # Почти бессмертный босс, который всегда выбирает одну атаку
+        boss.max_hp = 1e9
+        boss.hp = boss.max_hp
+        boss.phases = [{'threshold': -1, 'patterns': [pattern]}]
+        boss.last_attack_time = Akedo.game_clock.get_ticks() - boss.attack_cooldown
+        return session, None
+    return setup
+
+
+def setup_mass_suicide():
+    # 200 смертников, которые взрываются в течение первых кадров
+    session = new_session(24)
+    now = Akedo.game_clock.get_ticks()
+    for _ in range(200):
+        enemy = Akedo.SuicideEnemy(random.randint(0, Akedo.SCREEN_WIDTH), random.randint(0, Akedo.SCREEN_HEIGHT), wave=24)
+        enemy.shaking = True
+        enemy.shake_start_time = now - enemy.shake_duration + random.randint(0, 300)
+        session.enemies.append(enemy)
+    return session, None
+
+
+SCENARIOS = {
+    'wave24_spawn': setup_wave24_spawn,
+    'stress_300': setup_stress_300,
+    'stress_300_swarm': setup_stress_300_swarm,
+    'boss_explode_shot': make_boss_setup('explode_shot'),
+    'boss_burst_shot': make_boss_setup('burst_shot'),
+    'boss_laser_beam': make_boss_setup('laser_beam'),
+    'boss_summon_suicide_enemies': make_boss_setup('summon_suicide_enemies'),
+    'mass_suicide': setup_mass_suicide,
+    'menu_idle': None
+}
+
+
+def run_scenario(name, frames, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    Akedo.game_clock.simulate(0)
+    Akedo.dirty_renderer.invalidate()
+    timings = {phase: [] for phase in PHASES}
+    peak_enemies = peak_projectiles = 0
+
+    if SCENARIOS[name] is None:
+        # Простой главного меню: кэшированный кадр, на экран выводятся только появление и исчезновение глитча
+        menu_font = pygame.font.SysFont('Courier', 56)
+        menu_screen = Akedo.MenuScreen(lambda surface: Akedo.draw_main_menu(surface, menu_font, 0))
+        for _ in range(frames):
+            start = time.perf_counter()
+            menu_screen.refresh()
+            rendered = time.perf_counter()
+            menu_screen.present()
+            done = time.perf_counter()
+            timings['update'].append(0.0)
+            timings['collision'].append(0.0)
+            timings['render'].append(rendered - start)
+            timings['post'].append(done - rendered)
+        return summarize(name, frames, seed, timings, 0, 0)
+
+    session, first_frame_action = SCENARIOS[name]()
+    for frame in range(frames):
+        Akedo.game_clock.advance(FRAME_MS)
+        start = time.perf_counter()
+        if frame == 0 and first_frame_action is not None:
+            first_frame_action()
+        session.update_entities(FRAME_MS)
+        updated = time.perf_counter()
+        session.resolve_collisions()
+        collided = time.perf_counter()
+        if Akedo.USE_DIRTY_RECTS:
+            Akedo.dirty_renderer.draw(session)
+            rendered = time.perf_counter()
+            Akedo.dirty_renderer.apply_vhs_effects()
+            Akedo.dirty_renderer.present()
+        else:
+            Akedo.screen.fill(Akedo.BACKGROUND_COLOR)
+            session.draw(Akedo.screen)
+            rendered = time.perf_counter()
+            Akedo.apply_vhs_effects(Akedo.screen)
+            pygame.display.flip()
+        done = time.perf_counter()
+
+        timings['update'].append(updated - start)
+        timings['collision'].append(collided - updated)
+        timings['render'].append(rendered - collided)
+        timings['post'].append(done - rendered)
+        peak_enemies = max(peak_enemies, len(session.enemies))
+        peak_projectiles = max(peak_projectiles, len(session.projectiles))
+
+    session.end_boss_fight()
+    Akedo.game_clock.use_real_time()
+    return summarize(name, frames, seed, timings, peak_enemies, peak_projectiles)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def describe(values):
+    values_ms = sorted(value * 1000 for value in values)
+    return {
+        'mean_ms': round(sum(values_ms) / len(values_ms), 4),
+        'p95_ms': round(percentile(values_ms, 0.95), 4),
+        'p99_ms': round(percentile(values_ms, 0.99), 4)
+    }
+
+
+def summarize(name, frames, seed, timings, peak_enemies, peak_projectiles):
+    totals = [sum(phase_times) for phase_times in zip(*(timings[phase] for phase in PHASES))]
+    return {
+        'scenario': name,
+        'frames': frames,
+        'seed': seed,
+        'peak_enemies': peak_enemies,
+        'peak_projectiles': peak_projectiles,
+        'total': describe(totals),
+        'phases': {phase: describe(timings[phase]) for phase in PHASES}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Named gameplay scenarios with per-phase frame timings.')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--dirty-rects', action='store_true', help='render gameplay scenarios with the dirty-rect renderer')
+    parser.add_argument('--ai-lod', action='store_true', help='steer distant enemies in round-robin slices (AIScheduler)')
+    parser.add_argument('--swarm-engine', action='store_true', help='update plain and shooter enemies in one NumPy batch (SwarmEngine)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+    Akedo.USE_DIRTY_RECTS = args.dirty_rects
+    Akedo.USE_AI_LOD = args.ai_lod
+    Akedo.USE_SWARM_ENGINE = args.swarm_engine
+
+    results = []
+    print(f"{'scenario':<30} {'mean':>8} {'p95':>8} {'p99':>8}  " + '  '.join(f'{phase:>9}' for phase in PHASES))
+    for name in args.scenarios.split(','):
+        result = run_scenario(name, args.frames, args.seed)
+        results.append(result)
+        total = result['total']
+        phases = '  '.join(f"{result['phases'][phase]['mean_ms']:>9.3f}" for phase in PHASES)
+        print(f"{name:<30} {total['mean_ms']:>8.3f} {total['p95_ms']:>8.3f} {total['p99_ms']:>8.3f}  {phases}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'python': sys.version.split()[0], 'pygame': pygame.version.ver, 'dirty_rects': args.dirty_rects, 'ai_lod': args.ai_lod, 'swarm_engine': args.swarm_engine, 'results': results}, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Регрессионный тест: забег, записанный через интерактивный цикл и закончившийся смертью,
+# должен воспроизводиться без окна с совпадающим отпечатком
+# Запуск: python -m unittest discover tests
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Akedo
+
+Akedo.settings_writer.enabled = False
+Akedo.bootstrap(headless=True)
+Akedo.settings['purchased_upgrades'] = []
+
+
+# Часы интерактивного цикла: каждый кадр длится ровно frame_ms, без ожидания
+class FixedClock:
+    def __init__(self, frame_ms, max_frames):
+        self.frame_ms = frame_ms
+        self.frames_left = max_frames
+
+    def tick(self, framerate=0):
+        self.frames_left -= 1
+        if self.frames_left < 0:
+            raise AssertionError('the player did not die within the frame limit')
+        return self.frame_ms
+
+
+RECORDING_SEED = 3  # main() берёт сид записи из общего random; с ним игрок погибает с ненулевым опытом
+
+
+def choose_damage(player):
+    Akedo.apply_upgrade(player, 'damage')
+    return 'damage'
+
+
+class RecordedDeathReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (Akedo.clock, Akedo.upgrade_menu, Akedo.record_path, Akedo.WAVE_COUNTDOWN_MS, Akedo.settings['currency'])
+        Akedo.clock = FixedClock(50, max_frames=3000)
+        Akedo.upgrade_menu = choose_damage  # Меню улучшений ждало бы клика
+        Akedo.WAVE_COUNTDOWN_MS = 100
+        handle, self.path = tempfile.mkstemp(suffix='.akr')
+        os.close(handle)
+        Akedo.record_path = self.path
+
+    def tearDown(self):
+        Akedo.clock, Akedo.upgrade_menu, Akedo.record_path, Akedo.WAVE_COUNTDOWN_MS, Akedo.settings['currency'] = self.saved
+        os.remove(self.path)
+
+    def test_death_replays_with_matching_checksum(self):
+        # Курсор dummy-драйвера стоит в углу; с этим сидом записи игрок погибает меньше чем за минуту игрового времени
+        random.seed(RECORDING_SEED)
+        Akedo.main()
+        header, _ = Akedo.load_replay(self.path)
+        result = Akedo.run_replay(self.path)
+        self.assertFalse(result['stopped'])
+        self.assertEqual(result['ticks'], header['ticks'])
+        self.assertTrue(result['checksum_match'])
+
+
+if __name__ == '__main__':
+    unittest.main()